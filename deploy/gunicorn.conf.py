@@ -0,0 +1,28 @@
+"""Настройки gunicorn для боевого режима.
+
+    gunicorn -c /code/deploy/gunicorn.conf.py yatube.wsgi
+
+Воркеры — процессы с потоками (gthread): представления в основном ждут
+SQLite и кеш, потоки закрывают это ожидание без лишней памяти. Статику
+и картинки отдаёт nginx (deploy/nginx.conf), воркеры байты файлов
+не передают. Все значения можно переопределить окружением.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'gthread'
+workers = int(os.environ.get(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1
+))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Перезапуск воркера после N запросов ограничивает рост памяти,
+# разброс не даёт всем воркерам перезапуститься одновременно
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 30
+graceful_timeout = 30
+# nginx держит соединения с клиентами сам, к gunicorn он ходит по keep-alive
+keepalive = 5
+accesslog = '-'
+forwarded_allow_ips = '*'
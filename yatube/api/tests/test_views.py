@@ -0,0 +1,112 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginator import NEXT, PREVIOUS, encode_cursor
+
+
+class FeedApiTest(TestCase):
+    NUM_POSTS_ALL = 7
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(title='API', slug='api')
+        for i in range(cls.NUM_POSTS_ALL):
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост {i}')
+        cls.post = Post.objects.latest('pk')
+        for i in range(3):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'Комментарий {i}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def walk(self, url, **params):
+        """Прочитать всю выдачу порциями и вернуть записи."""
+        items = []
+        cursor = ''
+        while True:
+            _, body = self.get(url, cursor=cursor, **params)
+            data = json.loads(body)
+            items += data['results']
+            cursor = data['next']
+            if cursor is None:
+                return items
+
+    def test_feeds_cover_all_posts(self):
+        expected = list(Post.objects.order_by('-pub_date', '-pk')
+                        .values_list('pk', flat=True))
+        urls = (
+            reverse('api:index'),
+            reverse('api:group_posts', kwargs={'slug': self.group.slug}),
+            reverse('api:profile', kwargs={'username': self.author}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                items = self.walk(url, limit=3)
+                self.assertEqual([item['id'] for item in items], expected)
+
+    def test_follow_feed_requires_login(self):
+        url = reverse('api:follow_index')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        self.assertEqual(len(self.walk(url, limit=2)), self.NUM_POSTS_ALL)
+
+    def test_fields_selection(self):
+        _, body = self.get(reverse('api:index'), fields='id,author', limit=1)
+        self.assertEqual(json.loads(body)['results'],
+                         [{'id': self.post.pk, 'author': 'api_author'}])
+        response = self.client.get(reverse('api:index'), {'fields': 'pass'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ndjson(self):
+        response, body = self.get(reverse('api:index'), limit=5,
+                                  format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 6)
+        self.assertIn('next', lines[-1])
+
+    def test_post_detail_with_comments(self):
+        _, body = self.get(
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        data = json.loads(body)
+        self.assertEqual(data['post']['text'], self.post.text)
+        self.assertEqual([item['text'] for item in data['results']],
+                         ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'])
+
+    def test_etag_changes_on_write(self):
+        url = reverse('api:index')
+        response, _ = self.get(url)
+        tag = response['ETag']
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(not_modified.status_code, 304)
+        Post.objects.create(author=self.author, text='Новый')
+        response, _ = self.get(url)
+        self.assertNotEqual(response['ETag'], tag)
+
+    def test_bad_requests(self):
+        url = reverse('api:index')
+        backwards = encode_cursor(PREVIOUS, None)
+        malformed = encode_cursor(NEXT, [True, 1])
+        for params in ({'limit': 0}, {'limit': 'x'}, {'cursor': backwards},
+                       {'cursor': malformed}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code,
+                                 400)
+        self.assertEqual(self.client.post(url).status_code, 405)
@@ -0,0 +1,233 @@
+"""Потоковое JSON/NDJSON API только для чтения.
+
+    GET /api/v1/posts/?limit=100&fields=id,text&cursor=...
+    Accept: application/x-ndjson  (или ?format=ndjson)
+
+Записи читаются QuerySet.values().iterator() и отдаются по одной через
+StreamingHttpResponse, так что память не растёт с размером выдачи.
+Курсор следующей порции приходит последним: в поле "next" для JSON
+и отдельной строкой {"next": ...} для NDJSON. ETag строится из версий
+областей кеша posts.caching, поэтому меняется при любой записи, которая
+видна в выдаче.
+"""
+import hashlib
+import json
+from functools import wraps
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import etag, require_safe
+
+from core import replicas
+from posts import caching, timeline
+from posts.models import Group, Post
+from posts.paginator import (
+    NEXT, CursorPaginator, decode_cursor, encode_cursor,
+)
+from posts.views import COMMENT_ORDERING, post_scopes
+
+User = get_user_model()
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NDJSON = 'application/x-ndjson'
+
+# Имя поля в ответе: поиск для values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def scopes_etag(scopes):
+    """ETag по версиям областей кеша и параметрам запроса."""
+    def etag_func(request, **kwargs):
+        found = caching.versions(scopes(**kwargs))
+        if replicas.lagging(max(found)):
+            # Реплика могла отдать данные старше версии в ETag
+            return None
+        raw = '\n'.join([
+            '.'.join(str(number) for number in found),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        ])
+        return hashlib.md5(raw.encode()).hexdigest()
+    return etag_func
+
+
+def image_url(name):
+    return default_storage.url(name) if name else None
+
+
+def wants_ndjson(request):
+    return (request.GET.get('format') == 'ndjson'
+            or NDJSON in request.META.get('HTTP_ACCEPT', ''))
+
+
+def selected_fields(request, available):
+    names = request.GET.get('fields')
+    if not names:
+        return list(available)
+    names = names.split(',')
+    unknown = set(names) - set(available)
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return names
+
+
+def limit(request):
+    try:
+        value = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('limit должен быть числом')
+    if not 1 <= value <= MAX_LIMIT:
+        raise BadRequest(f'limit должен быть от 1 до {MAX_LIMIT}')
+    return value
+
+
+def rows(request, queryset, available, **options):
+    """Записи после курсора как (строки, курсор следующей порции).
+
+    Строки — ленивый генератор словарей с выбранными полями; курсор
+    доступен как next_cursor() после того, как строки прочитаны.
+    """
+    names = selected_fields(request, available)
+    size = limit(request)
+    cursor = request.GET.get('cursor')
+    if cursor and decode_cursor(cursor)[0] != NEXT:
+        raise BadRequest('Поддерживаются только курсоры вперёд')
+    paginator = CursorPaginator(queryset, size, **options)
+    try:
+        queryset = paginator.cursor_queryset(cursor)
+    except ValidationError:
+        raise BadRequest('Курсор не подходит к выдаче')
+    lookups = {available[name] for name in names} | set(paginator.keys)
+    # Строки читаются уже после ответа представления: база выбирается
+    # сейчас, пока действуют правила core.replicas для этого запроса
+    queryset = queryset.using(queryset.db)
+    found = islice(queryset.values(*lookups).iterator(), size + 1)
+    state = {'next': None}
+
+    def generate():
+        last = None
+        for count, row in enumerate(found):
+            if count == size:
+                state['next'] = encode_cursor(NEXT, [
+                    last[key].isoformat() if hasattr(last[key], 'isoformat')
+                    else last[key] for key in paginator.keys
+                ])
+                return
+            last = row
+            item = {name: row[available[name]] for name in names}
+            if 'image' in item:
+                item['image'] = image_url(item['image'])
+            yield item
+
+    return generate(), lambda: state['next']
+
+
+def stream(request, items, next_cursor, head=None):
+    """Ответ с потоком записей в JSON или NDJSON."""
+    if wants_ndjson(request):
+        def body():
+            if head is not None:
+                yield dumps(head) + '\n'
+            for item in items:
+                yield dumps(item) + '\n'
+            if next_cursor():
+                yield dumps({'next': next_cursor()}) + '\n'
+        return StreamingHttpResponse(body(), content_type=NDJSON)
+
+    def body():
+        yield '{'
+        if head is not None:
+            yield f'"post":{dumps(head)},'
+        yield '"results":['
+        for count, item in enumerate(items):
+            yield (',' if count else '') + dumps(item)
+        yield f'],"next":{dumps(next_cursor())}}}'
+    return StreamingHttpResponse(body(), content_type='application/json')
+
+
+def api_view(scopes=None):
+    """Только GET/HEAD, ETag по областям кеша и ошибки 400 в JSON."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            try:
+                return view_func(request, *args, **kwargs)
+            except BadRequest as error:
+                return JsonResponse({'detail': str(error)}, status=400)
+        if scopes is not None:
+            wrapper = etag(scopes_etag(scopes))(wrapper)
+        return require_safe(wrapper)
+    return decorator
+
+
+def feed(request, posts, **options):
+    items, next_cursor = rows(request, posts, POST_FIELDS, **options)
+    return stream(request, items, next_cursor)
+
+
+@api_view(lambda: ['index'])
+def index(request):
+    return feed(request, Post.objects.all())
+
+
+@api_view(lambda slug: [f'group:{slug}'])
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed(request, group.posts.all())
+
+
+@api_view(lambda username: [f'profile:{username}'])
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed(request, author.posts.all())
+
+
+@api_view()
+def follow_index(request):
+    """Лента подписок; ETag нет, её меняют записи многих авторов."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Нужна авторизация'}, status=401)
+    posts, options = timeline.feed(request.user)
+    return feed(request, posts, **options)
+
+
+@api_view(post_scopes)
+def post_detail(request, post_id):
+    """Пост и комментарии по возрастанию даты; fields — для комментариев."""
+    post = get_object_or_404(
+        Post.objects.values(*POST_FIELDS.values()), pk=post_id
+    )
+    head = {name: post[lookup] for name, lookup in POST_FIELDS.items()}
+    head['image'] = image_url(head['image'])
+    comments = Post(pk=post_id).comments.all()
+    items, next_cursor = rows(request, comments, COMMENT_FIELDS,
+                              ordering=COMMENT_ORDERING)
+    return stream(request, items, next_cursor, head=head)
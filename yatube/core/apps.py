@@ -3,3 +3,12 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metrics import instrument_templates
+        from .sqlite import configure
+        instrument_templates()
+        connection_created.connect(configure,
+                                   dispatch_uid='core.sqlite.configure')
@@ -0,0 +1,110 @@
+"""Чтение из кеша с защитой от «эффекта толпы» (cache stampede).
+
+get_or_set() хранит вместе со значением логический срок и время,
+за которое значение было посчитано. Незадолго до истечения срока
+запрос с вероятностью, растущей к концу срока, пересчитывает значение
+заранее (probabilistic early expiration, XFetch). Пересчитывает только
+тот, кто взял блокировку: остальные потоки этого процесса ждут его
+результата, а другие процессы отдают устаревшее значение или ждут,
+пока оно появится в общем кеше.
+"""
+import math
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+from .metrics import record_cache
+
+LOCK_KEY = '{}:lock'
+POLL_INTERVAL = 0.05
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _is_fresh(expires_at, delta):
+    """XFetch: чем ближе срок и дороже пересчёт, тем вероятнее обновить."""
+    beta = settings.CACHE_EARLY_EXPIRY_BETA
+    early = delta * beta * -math.log(1 - random.random())
+    return time.time() + early < expires_at
+
+
+def _wait_for(key, cache):
+    """Подождать значение, которое считает другой процесс."""
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _compute(key, producer, timeout, cache, cacheable):
+    started = time.monotonic()
+    value = producer()
+    delta = time.monotonic() - started
+    if cacheable is None or cacheable(value):
+        if timeout is None:
+            cache.set(key, (value, math.inf, delta), None)
+        else:
+            cache.set(key, (value, time.time() + timeout, delta),
+                      timeout + settings.CACHE_STALE_TIMEOUT)
+    return value
+
+
+def _single_flight(key, compute):
+    """Один пересчёт ключа на процесс: остальные потоки ждут результат."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = {'done': threading.Event()}
+    if not leader:
+        flight['done'].wait(settings.CACHE_LOCK_TIMEOUT)
+        if 'value' in flight:
+            return flight['value']
+        return compute()
+    try:
+        flight['value'] = compute()
+        return flight['value']
+    finally:
+        flight['done'].set()
+        with _flights_lock:
+            _flights.pop(key, None)
+
+
+def get_or_set(key, producer, timeout, cache=None, cacheable=None):
+    """Значение из кеша или результат producer() без одновременных пересчётов.
+
+    timeout=None хранит значение бессрочно. cacheable(value) может
+    запретить сохранение конкретного результата.
+    """
+    cache = cache or default_cache
+    entry = cache.get(key)
+    fresh = entry is not None and _is_fresh(*entry[1:])
+    record_cache(fresh)
+    if fresh:
+        return entry[0]
+
+    def compute():
+        lock = LOCK_KEY.format(key)
+        acquired = cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT)
+        if not acquired:
+            if entry is not None:
+                return entry[0]
+            waited = _wait_for(key, cache)
+            if waited is not None:
+                return waited[0]
+        try:
+            return _compute(key, producer, timeout, cache, cacheable)
+        finally:
+            # Не дождавшись, считаем сами, но блокировку другого
+            # процесса не снимаем: иначе пересчёт начнёт и третий
+            if acquired:
+                cache.delete(lock)
+
+    return _single_flight(key, compute)
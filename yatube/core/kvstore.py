@@ -0,0 +1,111 @@
+"""Хранилище метаданных sorl-thumbnail без базы данных.
+
+По умолчанию sorl держит размеры картинок и списки их миниатюр в таблице
+thumbnail_kvstore, и каждый промах её кеша — запрос к SQLite. KVStore
+хранит их в общем кеше (THUMBNAIL_CACHE), а перед ним — в LRU процесса
+на THUMBNAIL_LRU_SIZE записей, так что повторные обращения не выходят
+даже в кеш. warm() заранее читает записи для пачки картинок одним
+get_many. Вытесненная из кеша запись не теряет миниатюру: sorl найдёт
+готовый файл и заново прочитает только его размер.
+
+Ключи в общем кеше перечислить нельзя, поэтому cleanup и clear команды
+manage.py thumbnail видят только записи LRU своего процесса.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import deserialize
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+
+from .metrics import record_thumbnail
+
+
+class LRU:
+    """Словарь не больше size записей; вытесняется самая давняя."""
+
+    def __init__(self, size):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def keys(self):
+        with self.lock:
+            return list(self.items)
+
+
+class KVStore(KVStoreBase):
+    def __init__(self):
+        super().__init__()
+        self.lru = LRU(settings.THUMBNAIL_LRU_SIZE)
+
+    @property
+    def cache(self):
+        try:
+            return caches[sorl_settings.THUMBNAIL_CACHE]
+        except InvalidCacheBackendError:
+            return cache
+
+    def warm(self, names):
+        """Прочитать в LRU записи картинок names и их миниатюр."""
+        keys = [ImageFile(name).key for name in names]
+        found = self._warm([add_prefix(key, identity) for key in keys
+                            for identity in ('image', 'thumbnails')])
+        thumbnails = [
+            add_prefix(thumbnail)
+            for key, value in found.items()
+            if key.split('||')[1] == 'thumbnails'
+            for thumbnail in deserialize(value)
+        ]
+        self._warm(thumbnails)
+
+    def _warm(self, keys):
+        keys = [key for key in keys if self.lru.get(key) is None]
+        found = self.cache.get_many(keys) if keys else {}
+        for key, value in found.items():
+            self.lru.set(key, value)
+        return found
+
+    def _get_raw(self, key):
+        value = self.lru.get(key)
+        if value is not None:
+            record_thumbnail('lru')
+            return value
+        value = self.cache.get(key)
+        record_thumbnail('miss' if value is None else 'cache')
+        if value is not None:
+            self.lru.set(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        self.lru.set(key, value)
+        self.cache.set(key, value, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+
+    def _delete_raw(self, *keys):
+        for key in keys:
+            self.lru.delete(key)
+        self.cache.delete_many(keys)
+
+    def _find_keys_raw(self, prefix):
+        return [key for key in self.lru.keys() if key.startswith(prefix)]
@@ -0,0 +1,65 @@
+"""Предсжатие собранной статики для nginx (gzip_static, brotli_static).
+
+    python manage.py collectstatic --noinput
+    python manage.py compress_static
+
+Рядом с текстовыми файлами STATIC_ROOT кладутся .gz и, если установлен
+пакет brotli, .br. Веб-сервер отдаёт готовую копию без сжатия на лету.
+Копии, которые новее исходника, не пересоздаются.
+"""
+import gzip
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EXTENSIONS = ('.css', '.js', '.map', '.svg', '.html', '.txt', '.json',
+              '.xml', '.ico', '.ttf', '.eot')
+# Меньшие файлы умещаются в один пакет и без сжатия
+MIN_SIZE = 256
+
+
+def compressors():
+    found = [('.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        found.append(('.br', brotli.compress))
+    return found
+
+
+def compress(path, suffix, func):
+    """Сжать файл, если копии нет или она старше; True — если сжали."""
+    target = path + suffix
+    if (os.path.exists(target)
+            and os.path.getmtime(target) >= os.path.getmtime(path)):
+        return False
+    with open(path, 'rb') as source:
+        data = func(source.read())
+    if len(data) >= os.path.getsize(path):
+        return False
+    with open(target, 'wb') as copy:
+        copy.write(data)
+    return True
+
+
+class Command(BaseCommand):
+    help = 'Кладёт сжатые копии статики рядом с файлами STATIC_ROOT.'
+
+    def handle(self, *args, **options):
+        root = settings.STATIC_ROOT
+        if not root or not os.path.isdir(root):
+            raise CommandError('Сначала выполните collectstatic')
+        done = 0
+        for directory, _, files in os.walk(root):
+            for name in files:
+                path = os.path.join(directory, name)
+                if (not name.endswith(EXTENSIONS)
+                        or os.path.getsize(path) < MIN_SIZE):
+                    continue
+                for suffix, func in compressors():
+                    done += compress(path, suffix, func)
+        self.stdout.write(self.style.SUCCESS(f'Сжато копий: {done}'))
@@ -0,0 +1,37 @@
+"""Копирование основной базы SQLite в файлы реплик (core.replicas).
+
+    YATUBE_REPLICAS=/tmp/replica1.sqlite3,/tmp/replica2.sqlite3 \\
+        python manage.py sync_replicas
+
+Настоящие реплики наполняет репликация СУБД; локальные файлы SQLite
+изображают их, и команду можно запускать по расписанию, чтобы
+воспроизвести отставание.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.replicas import PRIMARY
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в реплики из DATABASE_REPLICAS.'
+
+    def handle(self, *args, **options):
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Команда копирует только базы SQLite')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: укажите YATUBE_REPLICAS')
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            connections[alias].close()
+            target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+            try:
+                # Онлайн-копия: пишущие в основную базу не блокируются
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(f'{alias}: готово')
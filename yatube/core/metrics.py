@@ -0,0 +1,378 @@
+"""Метрики производительности запросов.
+
+MetricsMiddleware замеряет для каждого представления время ответа,
+число и время SQL-запросов ко всем базам, включая реплики
+(core.queries.wrap_queries), время рендера шаблонов, попадания в кеш
+core.cache и чтения метаданных миниатюр (core.kvstore). Итог запроса
+уходит в заголовок Server-Timing, накопленные значения — в /metrics в текстовом
+формате Prometheus.
+
+Метрики копятся в памяти процесса. Воркеры gunicorn слушают один сокет,
+и запрос /metrics попадает к случайному из них, поэтому при METRICS_DIR
+каждый процесс не реже раза в METRICS_FLUSH_SECONDS записывает свои
+значения в файл <pid>.json этого каталога, а /metrics отдаёт их сумму.
+Файлы завершившихся воркеров (max_requests) сливаются в archive.json,
+так что счётчики не откатываются назад. Каталог должен очищаться при
+перезапуске сервиса (в docker-compose.yml это tmpfs).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.base import Template
+
+from .queries import wrap_queries
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_flush_lock = threading.Lock()
+_flushed = {'at': None}
+ARCHIVE = 'archive.json'
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts, total = self.series.get(
+                labels, ([0] * (len(self.buckets) + 1), 0)
+            )
+            counts[bisect_left(self.buckets, value)] += 1
+            self.series[labels] = counts, total + value
+
+    def snapshot(self):
+        with self.lock:
+            return [[labels, [list(counts), total]]
+                    for labels, (counts, total) in self.series.items()]
+
+    @staticmethod
+    def merge(series, rows):
+        for labels, (counts, total) in rows:
+            labels = tuple(tuple(pair) for pair in labels)
+            if labels in series:
+                old_counts, old_total = series[labels]
+                counts = [a + b for a, b in zip(old_counts, counts)]
+                total += old_total
+            series[labels] = counts, total
+
+    def lines(self, series=None):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} histogram'
+        if series is None:
+            with self.lock:
+                series = dict(self.series)
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket'
+                       f'{format_labels(labels + (("le", bound),))} '
+                       f'{cumulative}')
+            yield f'{self.name}_sum{format_labels(labels)} {total}'
+            yield f'{self.name}_count{format_labels(labels)} {cumulative}'
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.series = defaultdict(float)
+
+    def inc(self, labels, value=1):
+        with self.lock:
+            self.series[labels] += value
+
+    def snapshot(self):
+        with self.lock:
+            return [[labels, value] for labels, value in self.series.items()]
+
+    @staticmethod
+    def merge(series, rows):
+        for labels, value in rows:
+            labels = tuple(tuple(pair) for pair in labels)
+            series[labels] = series.get(labels, 0) + value
+
+    def lines(self, series=None):
+        yield f'# HELP {self.name} {self.help_text}'
+        yield f'# TYPE {self.name} counter'
+        if series is None:
+            with self.lock:
+                series = dict(self.series)
+        for labels, value in sorted(series.items()):
+            yield f'{self.name}{format_labels(labels)} {value}'
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds', 'Время ответа представления.',
+    LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'yatube_request_sql_queries', 'SQL-запросов за один ответ.',
+    QUERY_BUCKETS,
+)
+RESPONSES = Counter('yatube_responses_total', 'Ответы по кодам.')
+SQL_SECONDS = Counter('yatube_sql_seconds_total', 'Время SQL-запросов.')
+TEMPLATE_SECONDS = Counter('yatube_template_render_seconds_total',
+                           'Время рендера шаблонов.')
+CACHE_REQUESTS = Counter('yatube_cache_requests_total',
+                         'Обращения к кешу core.cache.get_or_set.')
+REQUEST_THUMBNAILS = Histogram(
+    'yatube_request_thumbnail_lookups',
+    'Чтений метаданных миниатюр sorl за один ответ.', QUERY_BUCKETS,
+)
+THUMBNAIL_LOOKUPS = Counter(
+    'yatube_thumbnail_lookups_total',
+    'Чтения метаданных миниатюр: lru, cache или miss (core.kvstore).',
+)
+METRICS = (REQUEST_SECONDS, REQUEST_QUERIES, RESPONSES, SQL_SECONDS,
+           TEMPLATE_SECONDS, CACHE_REQUESTS, REQUEST_THUMBNAILS,
+           THUMBNAIL_LOOKUPS)
+
+
+class RequestTimings:
+    """Замеры текущего запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.template_depth = 0
+        self.cache = {'hit': 0, 'miss': 0}
+        self.thumbnails = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql += time.perf_counter() - started
+
+
+def current():
+    return getattr(_local, 'timings', None)
+
+
+def record_cache(hit):
+    """Отметить попадание или промах кеша в текущем запросе."""
+    result = 'hit' if hit else 'miss'
+    timings = current()
+    view = getattr(_local, 'view', 'none')
+    CACHE_REQUESTS.inc((('result', result), ('view', view)))
+    if timings is not None:
+        timings.cache[result] += 1
+
+
+def record_thumbnail(result):
+    """Отметить чтение метаданных миниатюры: lru, cache или miss."""
+    timings = current()
+    view = getattr(_local, 'view', 'none')
+    THUMBNAIL_LOOKUPS.inc((('result', result), ('view', view)))
+    if timings is not None:
+        timings.thumbnails += 1
+
+
+def instrument_templates():
+    """Учитывать время Template.render (вложенные шаблоны — один раз)."""
+    original = Template.render
+    if getattr(original, 'instrumented', False):
+        return
+
+    def render(self, context):
+        timings = current()
+        if timings is None:
+            return original(self, context)
+        timings.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            timings.template_depth -= 1
+            if not timings.template_depth:
+                timings.template += time.perf_counter() - started
+
+    render.instrumented = True
+    Template.render = render
+
+
+def server_timing(timings, total):
+    return ', '.join([
+        f'db;dur={timings.sql * 1000:.1f};desc="{timings.queries} SQL"',
+        f'tpl;dur={timings.template * 1000:.1f}',
+        f'cache;desc="hit={timings.cache["hit"]} '
+        f'miss={timings.cache["miss"]}"',
+        f'thumb;desc="{timings.thumbnails} lookups"',
+        f'total;dur={total * 1000:.1f}',
+    ])
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = _local.timings = RequestTimings()
+        _local.view = 'unresolved'
+        try:
+            with wrap_queries(timings):
+                response = self.get_response(request)
+        finally:
+            _local.timings = None
+            _local.view = 'none'
+        total = time.perf_counter() - timings.started
+        match = request.resolver_match
+        view = (('view', match.view_name if match else 'unresolved'),)
+        REQUEST_SECONDS.observe(view, total)
+        REQUEST_QUERIES.observe(view, timings.queries)
+        REQUEST_THUMBNAILS.observe(view, timings.thumbnails)
+        SQL_SECONDS.inc(view, timings.sql)
+        TEMPLATE_SECONDS.inc(view, timings.template)
+        RESPONSES.inc(view + (('status', response.status_code),))
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = server_timing(timings, total)
+        if settings.METRICS_DIR:
+            flush_if_due()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = request.resolver_match.view_name
+
+
+def _path(name):
+    return os.path.join(settings.METRICS_DIR, name)
+
+
+def _read(name):
+    try:
+        with open(_path(name)) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(name, snapshot):
+    # Через временный файл: читатель не увидит наполовину записанный
+    temporary = _path(f'.{name}.{os.getpid()}.tmp')
+    with open(temporary, 'w') as target:
+        json.dump(snapshot, target)
+    os.replace(temporary, _path(name))
+
+
+def _merge(snapshots):
+    merged = {metric.name: {} for metric in METRICS}
+    for snapshot in snapshots:
+        for metric in METRICS:
+            metric.merge(merged[metric.name], snapshot.get(metric.name, []))
+    return merged
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _locked():
+    """Блокировка каталога метрик между процессами."""
+    import fcntl
+
+    with open(_path('.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _archive(pids):
+    """Слить файлы процессов pids в archive.json и удалить их.
+
+    Вызывается под _locked().
+    """
+    names = [f'{pid}.json' for pid in pids
+             if os.path.exists(_path(f'{pid}.json'))]
+    if not names:
+        return
+    merged = _merge([_read(ARCHIVE)] + [_read(name) for name in names])
+    _write(ARCHIVE, {name: [[list(labels), value]
+                            for labels, value in series.items()]
+                     for name, series in merged.items()})
+    for name in names:
+        os.remove(_path(name))
+
+
+def flush():
+    """Записать метрики процесса в METRICS_DIR/<pid>.json."""
+    with _flush_lock:
+        if _flushed['at'] is None:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            # Файл с нашим pid остался от завершившегося процесса
+            with _locked():
+                _archive([os.getpid()])
+        _write(f'{os.getpid()}.json',
+               {metric.name: metric.snapshot() for metric in METRICS})
+        _flushed['at'] = time.monotonic()
+
+
+def flush_if_due():
+    flushed = _flushed['at']
+    if (flushed is None or time.monotonic() - flushed
+            >= settings.METRICS_FLUSH_SECONDS):
+        try:
+            flush()
+        except OSError:
+            # Ответ важнее метрик: запишем при следующем запросе
+            logger.exception('Не удалось записать метрики')
+
+
+def collect():
+    """Сумма метрик всех процессов из METRICS_DIR."""
+    flush()
+    with _locked():
+        pids = [int(name[:-5]) for name in os.listdir(settings.METRICS_DIR)
+                if name.endswith('.json') and name[:-5].isdigit()]
+        _archive([pid for pid in pids if not _alive(pid)])
+        names = [name for name in os.listdir(settings.METRICS_DIR)
+                 if name.endswith('.json') and not name.startswith('.')]
+        return _merge(_read(name) for name in names)
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus."""
+    merged = collect() if settings.METRICS_DIR else {}
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.lines(merged.get(metric.name)))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,61 @@
+"""Бюджет SQL-запросов представления.
+
+    @query_budget(4)
+    def index(request): ...
+
+Запросы ко всем базам, включая реплики core.replicas, считаются через
+execute_wrapper вместе с рендером шаблона. При превышении бюджета
+пишется предупреждение в лог, а при QUERY_BUDGET_STRICT = True
+выбрасывается QueryBudgetExceeded — так N+1 в тестах роняет прогон.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def wrap_queries(wrapper):
+    """execute_wrapper на соединениях всех баз из DATABASES."""
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(wrapper))
+        yield
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(budget):
+    """Декоратор: представление делает не больше budget запросов."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with wrap_queries(counter):
+                response = view_func(request, *args, **kwargs)
+            if counter.count > budget:
+                message = (f'{view_func.__name__}: {counter.count} SQL-'
+                           f'запросов при бюджете {budget} '
+                           f'({request.get_full_path()})')
+                if settings.QUERY_BUDGET_STRICT:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = budget
+        return wrapper
+    return decorator
@@ -0,0 +1,105 @@
+"""Чтение с реплик базы, запись — в основную.
+
+ReplicaRouter пишет в default, а читает из реплики DATABASE_REPLICAS,
+которую ReplicaMiddleware выбирает случайно один раз на запрос: все
+чтения запроса видят один и тот же снимок данных. Реплики отстают
+от основной базы, поэтому чтение идёт с основной, когда:
+- представление помечено use_primary — оно пишет и читает свои данные;
+- текущий запрос уже что-то записал;
+- пользователь сам писал меньше REPLICA_STICKY_SECONDS назад: это
+  помнит cookie, которую ставит ReplicaMiddleware;
+- страница зависит от областей кеша, изменённых за это время
+  (after_write), иначе в кеш попала бы устаревшая страница.
+Без реплик всё читается из default.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'read_primary'
+# Сессии читаются на каждый запрос и сразу после входа — только с основной
+PRIMARY_APPS = {'sessions'}
+
+_local = threading.local()
+
+
+def replicas():
+    return settings.DATABASE_REPLICAS
+
+
+@contextmanager
+def primary():
+    """Читать с основной базы внутри блока."""
+    _local.pinned = getattr(_local, 'pinned', 0) + 1
+    try:
+        yield
+    finally:
+        _local.pinned -= 1
+
+
+def use_primary(view_func):
+    """Декоратор: представление читает только с основной базы."""
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        with primary():
+            return view_func(*args, **kwargs)
+    return wrapper
+
+
+def lagging(written_at):
+    """Запись с отметкой time.time_ns() могла ещё не дойти до реплик."""
+    lag = settings.REPLICA_STICKY_SECONDS * 10 ** 9
+    return bool(replicas()) and time.time_ns() - written_at < lag
+
+
+def after_write(written_at):
+    """Контекст чтения данных, изменённых в момент written_at."""
+    return primary() if lagging(written_at) else nullcontext()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (not replicas() or getattr(_local, 'pinned', 0)
+                or getattr(_local, 'wrote', False)
+                or model._meta.app_label in PRIMARY_APPS):
+            return PRIMARY
+        return getattr(_local, 'replica', None) or random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и в основной базе
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    """Закрепляет за пользователем основную базу после его записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.wrote = False
+        _local.replica = random.choice(replicas()) if replicas() else None
+        sticky = STICKY_COOKIE in request.COOKIES
+        try:
+            with primary() if sticky else nullcontext():
+                response = self.get_response(request)
+            wrote = _local.wrote
+        finally:
+            _local.wrote = False
+            _local.replica = None
+        if wrote and replicas():
+            response.set_cookie(STICKY_COOKIE, '1', httponly=True,
+                                max_age=settings.REPLICA_STICKY_SECONDS)
+        return response
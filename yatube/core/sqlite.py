@@ -0,0 +1,61 @@
+"""Настройка SQLite под одновременные чтения и записи.
+
+Каждому новому соединению ставятся прагмы из SQLITE_PRAGMAS: журнал WAL
+(читатели не ждут писателя и наоборот), synchronous=NORMAL, mmap, кеш
+страниц и busy_timeout — писатель ждёт чужую блокировку, а не падает
+сразу с «database is locked». Соединения переиспользуются
+в течение CONN_MAX_AGE.
+
+Ожидание не спасает транзакцию, которая начала с чтения, а записать
+пытается после другого писателя: SQLite сразу возвращает ошибку.
+Поэтому записывающие представления обёрнуты в retry_on_lock — запись
+идёт одной транзакцией и при блокировке повторяется с растущей паузой.
+"""
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+# Пауза перед первым повтором, дальше удваивается
+RETRY_DELAY = 0.05
+
+
+def apply_pragmas(conn, pragmas):
+    """Выполнить прагмы на соединении DB-API (без обёрток Django)."""
+    for name, value in pragmas.items():
+        conn.execute(f'PRAGMA {name} = {value}')
+
+
+def configure(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
+
+
+def is_locked(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def retrying(func, attempts, errors=(OperationalError,)):
+    """Вызвать func, повторяя её при блокировке базы до attempts раз."""
+    for attempt in range(attempts):
+        try:
+            return func()
+        except errors as error:
+            if not is_locked(error) or attempt == attempts - 1:
+                raise
+            time.sleep(RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def retry_on_lock(func):
+    """Выполнять тело в транзакции, повторяя при блокировке базы."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        def attempt():
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        return retrying(attempt, settings.SQLITE_WRITE_RETRIES + 1)
+    return wrapper
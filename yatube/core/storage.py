@@ -0,0 +1,71 @@
+import hashlib
+import os
+import tempfile
+
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage, StaticFilesStorage,
+)
+from django.core.files.storage import FileSystemStorage
+
+
+class StaticStorage(ManifestStaticFilesStorage):
+    """Статика с хешем содержимого в имени файла.
+
+    Файл, которого нет в манифесте, отдаётся по исходному имени, а не
+    роняет рендер страницы ошибкой 500.
+    """
+    manifest_strict = False
+
+    def url(self, name, force=False):
+        try:
+            return super().url(name, force)
+        except ValueError:
+            return StaticFilesStorage.url(self, name)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Медиафайлы с именем по SHA-256 содержимого.
+
+    Файл posts/photo.webp сохраняется как posts/ab/abcd….webp; если такой
+    файл уже есть, второй не пишется, а у существующего обновляется время
+    изменения. Хеш считается в том же проходе,
+    которым содержимое копируется во временный файл, — загрузка не
+    перечитывается. Удалять файл, на который ещё ссылаются записи базы,
+    нельзя: за этим следит вызывающий код (posts.uploads.release).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя значит одинаковое содержимое
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.path(directory),
+                                         delete=False) as spooled:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                digest.update(chunk)
+                spooled.write(chunk)
+        digest = digest.hexdigest()
+        name = '/'.join(filter(None, [
+            directory.replace('\\', '/'), digest[:2],
+            digest + os.path.splitext(filename)[1].lower(),
+        ]))
+        path = self.path(name)
+        if os.path.exists(path):
+            os.remove(spooled.name)
+            # Свежая метка не даст release удалить файл, пока новая запись
+            # не зафиксирована (IMAGE_RELEASE_GRACE)
+            os.utime(path)
+            return name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(spooled.name, path)
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+        else:
+            # NamedTemporaryFile создаётся с правами 0600
+            os.chmod(path, 0o644)
+        return name
@@ -0,0 +1,44 @@
+"""Тег {% cache %} с защитой от одновременного пересчёта фрагмента.
+
+Синтаксис тот же, что у django.templatetags.cache, но фрагмент читается
+через core.cache.get_or_set: истекающий фрагмент обновляется заранее
+одним запросом, остальные получают готовое значение.
+"""
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode, do_cache
+
+from core.cache import get_or_set
+
+register = template.Library()
+
+
+class CoalescedCacheNode(CacheNode):
+    def _cache(self, context):
+        if self.cache_name:
+            return caches[self.cache_name.resolve(context)]
+        try:
+            return caches['template_fragments']
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def render(self, context):
+        expire_time = self.expire_time_var.resolve(context)
+        if expire_time is not None:
+            expire_time = int(expire_time)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_set(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time, cache=self._cache(context),
+        )
+
+
+@register.tag('cache')
+def do_coalesced_cache(parser, token):
+    node = do_cache(parser, token)
+    return CoalescedCacheNode(
+        node.nodelist, node.expire_time_var, node.fragment_name,
+        node.vary_on, node.cache_name,
+    )
@@ -0,0 +1,34 @@
+"""Боковая панель самых активных групп.
+
+    {% load group_sidebar %}
+    {% group_sidebar %}
+
+Список берётся из сводок GroupStats и хранится в кеше до следующего
+пересчёта сводок (область кеша 'groups'), поэтому страница с панелью
+не делает запросов к базе даже на промахе своего кеша.
+"""
+from django import template
+from django.conf import settings
+
+from core.cache import get_or_set
+from posts import caching
+from posts.models import GroupStats
+
+register = template.Library()
+
+SIDEBAR_KEY = 'posts:group_sidebar:{}:{}'
+
+
+def active_groups(limit):
+    return list(GroupStats.objects.select_related('group')
+                .exclude(last_post_at=None)
+                .order_by('-last_post_at', 'group_id')[:limit])
+
+
+@register.inclusion_tag('posts/includes/group_sidebar.html')
+def group_sidebar(limit=None):
+    limit = limit or settings.GROUP_SIDEBAR_SIZE
+    key = SIDEBAR_KEY.format(limit, caching.scope_version(['groups']))
+    groups = get_or_set(key, lambda: active_groups(limit),
+                        settings.POSTS_CACHE_TIMEOUT)
+    return {'groups': groups}
@@ -0,0 +1,74 @@
+"""Кеш отрисованных карточек постов в лентах.
+
+    {% load post_cards %}
+    {% for post in page_obj %}
+      {% post_card post "index" page_obj %} ... {% endpost_card %}
+    {% endfor %}
+
+Ключ карточки — вид ленты, id поста, Post.updated, имя автора и адрес
+его группы, поэтому правка поста меняет только его карточку, а новый
+пост в ленте не заставляет перерисовывать остальные. Ключи всех постов
+страницы читаются из кеша одним get_many при первой карточке;
+отрисовываются только промахи.
+"""
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from core.metrics import record_cache
+
+register = template.Library()
+
+CARD_KEY = 'posts:card:{}:{}:{}'
+
+
+def card_key(post, variant):
+    author = post.author
+    group = post.group.slug if post.group_id else ''
+    stamp = '\n'.join([post.updated.isoformat(), author.username,
+                       author.get_full_name(), group])
+    return CARD_KEY.format(variant, post.pk,
+                           hashlib.md5(stamp.encode()).hexdigest())
+
+
+class PostCardNode(template.Node):
+    def __init__(self, nodelist, post, variant, posts):
+        self.nodelist = nodelist
+        self.post = post
+        self.variant = variant
+        self.posts = posts
+
+    def cached_cards(self, context, variant):
+        """Карточки страницы из кеша, прочитанные одним запросом."""
+        cards = context.render_context.get(self)
+        if cards is None:
+            keys = [card_key(post, variant)
+                    for post in self.posts.resolve(context)]
+            cards = context.render_context[self] = cache.get_many(keys)
+        return cards
+
+    def render(self, context):
+        post = self.post.resolve(context)
+        variant = self.variant.resolve(context)
+        key = card_key(post, variant)
+        cards = self.cached_cards(context, variant)
+        record_cache(key in cards)
+        if key not in cards:
+            cards[key] = self.nodelist.render(context)
+            cache.set(key, cards[key], settings.POST_CARD_CACHE_TIMEOUT)
+        return cards[key]
+
+
+@register.tag
+def post_card(parser, token):
+    bits = token.split_contents()
+    if len(bits) != 4:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]}: нужны пост, вид ленты и список постов страницы'
+        )
+    nodelist = parser.parse(('endpost_card',))
+    parser.delete_first_token()
+    post, variant, posts = (parser.compile_filter(bit) for bit in bits[1:])
+    return PostCardNode(nodelist, post, variant, posts)
@@ -0,0 +1,36 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(post, size, loading='lazy'):
+    """{% post_image post "card" %} — картинка поста с srcset миниатюр.
+
+    Браузер выбирает ширину по sizes, формат — по первому подходящему
+    <source>; width/height задают пропорции до загрузки файла.
+    loading="eager" — для картинки, видимой сразу.
+    """
+    image = thumbnails.ready(post, size)
+    if image is None:
+        return {'image': None}
+    box_width, box_height = thumbnails.SIZES[size][:2]
+    sources = [
+        (mime, ', '.join(f'{url} {width}w' for url, width in srcset))
+        for mime, srcset in image['sources'].items()
+    ]
+    context = {
+        'image': image,
+        'sources': sources[:-1],
+        'srcset': sources[-1][1] if sources else '',
+        'sizes': f'(max-width: {box_width}px) 100vw, {box_width}px',
+        'loading': loading,
+    }
+    if image['width'] and image['height']:
+        scale = min(box_width / image['width'],
+                    box_height / image['height'])
+        context['width'] = round(image['width'] * scale)
+        context['height'] = round(image['height'] * scale)
+    return context
@@ -1,5 +1,12 @@
+import ipaddress
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from .metrics import exposition
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -18,3 +25,22 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def allowed_address(address, allowed):
+    """Адрес входит в один из адресов или сетей allowed."""
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in allowed)
+
+
+def metrics(request):
+    allowed = settings.METRICS_ALLOWED_IPS
+    if (allowed is not None and not allowed_address(
+            request.META.get('REMOTE_ADDR', ''), allowed)):
+        raise PermissionDenied
+    return HttpResponse(exposition(),
+                        content_type='text/plain; version=0.0.4')
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Post, Group
 
 
@@ -11,6 +12,12 @@ class PostAdmin(admin.ModelAdmin):
     # Это свойство сработает для всех колонок: где пусто — там будет эта строка
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по всей таблице — поиск по индексу
+        if not search_term:
+            return queryset, False
+        return queryset.filter(search.matching_posts(search_term)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
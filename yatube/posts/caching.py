@@ -0,0 +1,133 @@
+"""Кеш страниц с версиями, которые сбрасываются при записи.
+
+Ключ страницы включает версии её областей («index», «group:<slug>»,
+«profile:<username>», «post:<id>»). Сигналы posts.signals меняют версию
+области после записи, поэтому страницы можно хранить долго и при этом
+показывать изменения сразу.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from core import replicas
+from core.cache import get_or_set
+
+VERSION_KEY = 'posts:version:{}'
+PAGE_KEY = 'posts:page:{}:{}'
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def version_key(scope):
+    # В области бывают имена пользователей и слаги на любом языке
+    return VERSION_KEY.format(hashlib.md5(scope.encode()).hexdigest())
+
+
+def versions(scopes):
+    """Текущие версии областей; отсутствующие заводятся заново."""
+    keys = [version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сбросить кеш страниц, зависящих от областей."""
+    version = _new_version()
+    cache.set_many({version_key(scope): version for scope in scopes}, None)
+
+
+def scope_version(scopes):
+    """Общая версия набора областей одной строкой."""
+    return '.'.join(str(version) for version in versions(scopes))
+
+
+def page_hash(version, request):
+    """Хеш версии, адреса и cookie (как Vary: Cookie)."""
+    raw = '\n'.join([
+        version,
+        request.get_full_path(),
+        request.META.get('HTTP_COOKIE', ''),
+    ])
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_key(name, version, request):
+    return PAGE_KEY.format(name, page_hash(version, request))
+
+
+def set_validators(response, etag, last_modified):
+    """ETag, Last-Modified и требование сверяться с сервером."""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_page(name, scopes):
+    """Кешировать GET-ответ представления до записи в его области.
+
+    scopes(**kwargs) возвращает области страницы по аргументам из URL.
+    Версия областей доступна шаблону как request.cache_version.
+    Одновременные промахи по одной странице рендерят её один раз
+    (core.cache.get_or_set).
+
+    Версии — время записи в наносекундах, поэтому из них же без
+    отрисовки получаются ETag и Last-Modified: повторный запрос
+    неизменившейся страницы получает 304 Not Modified.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            found = versions(scopes(**kwargs))
+            version = '.'.join(str(number) for number in found)
+            request.cache_version = version
+            etag = quote_etag(page_hash(version, request))
+            # Дата не отличает страницы разных cookie, её получает
+            # только страница без cookie — общая для всех, как в CDN
+            last_modified = (None if request.META.get('HTTP_COOKIE')
+                             else max(found) // 10 ** 9)
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=last_modified
+            )
+            if not_modified is not None:
+                return set_validators(not_modified, etag, last_modified)
+
+            def render():
+                # Свежие изменения могли не дойти до реплик
+                with replicas.after_write(max(found)):
+                    response = view_func(request, *args, **kwargs)
+                if cacheable(response):
+                    patch_vary_headers(response, ('Cookie',))
+                    if hasattr(response, 'render'):
+                        response.render()
+                return response
+
+            response = get_or_set(
+                page_key(name, version, request), render,
+                settings.POSTS_CACHE_TIMEOUT, cacheable=cacheable,
+            )
+            if cacheable(response):
+                set_validators(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
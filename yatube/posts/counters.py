@@ -0,0 +1,123 @@
+"""Денормализованные счётчики постов, подписок и комментариев.
+
+Счётчики меняются атомарными UPDATE с F() из сигналов posts.signals,
+поэтому профиль и страница поста не считают записи на каждый запрос.
+Операции в обход сигналов (bulk_create, queryset.update) счётчики
+не трогают — расхождения исправляет manage.py recount.
+
+Сводки групп (GroupStats) сигналы не трогают: их раз в несколько минут
+пересчитывает manage.py group_stats --watch, и страницы групп
+показывают данные на момент последнего пересчёта.
+"""
+import json
+from itertools import groupby
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching
+from .models import AuthorStats, Comment, Follow, Group, GroupStats, Post
+
+User = get_user_model()
+
+
+def bump_author(user_id, **deltas):
+    """Изменить счётчики автора, например bump_author(1, posts_count=1)."""
+    AuthorStats.objects.filter(user_id=user_id).update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def bump_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta
+    )
+
+
+def stats(user):
+    """Счётчики автора; недостающая запись создаётся пересчётом."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        recount_authors(User.objects.filter(pk=user.pk))
+        return AuthorStats.objects.get(user=user)
+
+
+def _count(queryset, field, outer='user_id'):
+    """Подзапрос числа строк queryset, связанных с внешней строкой."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total')
+    ), Value(0))
+
+
+def recount_authors(users=None):
+    """Пересчитать счётчики авторов (по умолчанию — всех)."""
+    users = User.objects.all() if users is None else users
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in
+         users.filter(stats__isnull=True).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    return AuthorStats.objects.filter(user__in=users).update(
+        posts_count=_count(Post.objects, 'author'),
+        followers_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
+
+
+def recount_posts(posts=None):
+    """Пересчитать число комментариев у постов (по умолчанию — у всех)."""
+    posts = Post.objects.all() if posts is None else posts
+    return posts.update(comments_count=Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(total=Count('pk'))
+        .values('total')
+    ), Value(0)))
+
+
+def _top_authors(groups):
+    """Самые активные авторы групп: {id группы: [[username, постов]]}."""
+    rows = (Post.objects.filter(group__in=groups)
+            .values_list('group_id', 'author__username')
+            .annotate(total=Count('pk'))
+            .order_by('group_id', '-total', 'author__username'))
+    return {
+        group_id: [[username, total] for _, username, total
+                   in list(found)[:settings.GROUP_TOP_AUTHORS]]
+        for group_id, found in groupby(rows, key=lambda row: row[0])
+    }
+
+
+def recount_groups(groups=None):
+    """Пересчитать сводки групп (по умолчанию — всех)."""
+    groups = Group.objects.all() if groups is None else groups
+    GroupStats.objects.bulk_create(
+        [GroupStats(group_id=pk) for pk in
+         groups.filter(stats__isnull=True).values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    stats = GroupStats.objects.filter(group__in=groups)
+    count = stats.update(
+        posts_count=_count(Post.objects, 'group', 'group_id'),
+        last_post_at=Subquery(
+            Post.objects.filter(group=OuterRef('group_id'))
+            .order_by('-pub_date').values('pub_date')[:1]
+        ),
+        top_authors='[]',
+        refreshed=timezone.now(),
+    )
+    top = _top_authors(groups)
+    GroupStats.objects.bulk_update(
+        [GroupStats(pk=pk, top_authors=json.dumps(top[group_id],
+                                                  ensure_ascii=False))
+         for pk, group_id in stats.values_list('pk', 'group_id')
+         if group_id in top],
+        ['top_authors'], batch_size=500,
+    )
+    caching.bump('groups')
+    return count
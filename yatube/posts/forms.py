@@ -1,5 +1,11 @@
 # forms.py
+from concurrent.futures.process import BrokenProcessPool
+
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+
+from . import uploads
 from .models import Post, Comment
 
 
@@ -16,6 +22,22 @@ class PostForm(forms.ModelForm):
             'group': ('Напишите название группы')
         }
 
+    def clean_image(self):
+        """Пережать новую картинку и запомнить её размеры."""
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            if not image:
+                self.instance.image_width = self.instance.image_height = None
+            return image
+        try:
+            image = uploads.ingest(image)
+        except (OSError, ValueError, Image.DecompressionBombError,
+                BrokenProcessPool):
+            raise forms.ValidationError('Не удалось обработать картинку')
+        self.instance.image_width = image.width
+        self.instance.image_height = image.height
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
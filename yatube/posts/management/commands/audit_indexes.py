@@ -0,0 +1,104 @@
+"""Проверка планов запросов, которые выполняют представления posts.
+
+    python manage.py audit_indexes [-v 2]
+
+Для каждого запроса выполняется EXPLAIN QUERY PLAN; полный просмотр
+таблицы или сортировка во временном B-дереве считаются регрессией,
+и команда завершается с ошибкой.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import timeline
+from posts.models import Follow, Group, GroupStats, Post
+from posts.paginator import CursorPaginator, NEXT, encode_cursor
+from posts.views import COMMENT_ORDERING
+
+User = get_user_model()
+
+
+def feed_queries(name, posts, **options):
+    """Первая и «глубокая» страницы ленты так, как их выбирает пагинатор."""
+    paginator = CursorPaginator(posts, 10, **options)
+    cursor = encode_cursor(NEXT, ['2000-01-01T00:00:00+00:00', 1])
+    return {
+        f'{name}: first page': paginator.cursor_queryset()[:11],
+        f'{name}: cursor page': paginator.cursor_queryset(cursor)[:11],
+    }
+
+
+def view_queries():
+    """Запросы представлений posts на условных объектах."""
+    user, author = User(pk=1), User(pk=2)
+    group, post = Group(pk=1), Post(pk=1)
+    queries = {}
+    queries.update(feed_queries(
+        'index', Post.objects.select_related('author', 'group')))
+    queries.update(feed_queries(
+        'group_posts', group.posts.select_related('author')))
+    queries.update(feed_queries(
+        'profile', author.posts.select_related('author')))
+    queries.update(feed_queries(
+        'post_detail: comments', post.comments.select_related('author'),
+        ordering=COMMENT_ORDERING))
+    posts, options = timeline.feed(user)
+    queries.update(feed_queries(
+        'follow_index', posts.select_related('author', 'group'), **options))
+    groups = (GroupStats.objects.select_related('group')
+              .order_by('-last_post_at', 'group_id'))
+    queries.update({
+        'group_index: page': groups[:61],
+        'group_sidebar': groups.exclude(last_post_at=None)[:10],
+        'group_posts: group': Group.objects.filter(slug='slug'),
+        'profile: author': User.objects.filter(username='name'),
+        'profile: following': Follow.objects.filter(
+            user=user, author=author),
+        'post_detail: post': Post.objects.filter(pk=post.pk),
+        'follow_index: celebrities': timeline.celebrity_ids(user),
+    })
+    return queries
+
+
+def problems(queryset):
+    """Строки плана с полным просмотром таблицы или лишней сортировкой.
+
+    Обход индекса (SCAN ... USING INDEX) допустим только в запросах
+    с LIMIT: тогда СУБД читает индекс по порядку и останавливается.
+    """
+    plan = queryset.explain()
+    limited = queryset.query.high_mark is not None
+    found = []
+    for line in plan.splitlines():
+        detail = line.upper()
+        if 'USE TEMP B-TREE' in detail:
+            found.append(line.strip())
+        elif 'SCAN' in detail and not (
+                'CONSTANT ROW' in detail
+                or limited and 'USING' in detail):
+            found.append(line.strip())
+    return plan, found
+
+
+class Command(BaseCommand):
+    help = 'Ищет полные просмотры таблиц в запросах представлений posts.'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN доступен только в SQLite.')
+        failed = []
+        for name, queryset in view_queries().items():
+            plan, found = problems(queryset)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{name}\n{plan}\n')
+            if found:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(name))
+                for line in found:
+                    self.stdout.write(f'    {line}')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+        if failed:
+            raise CommandError(
+                f'Запросы без подходящего индекса: {", ".join(failed)}'
+            )
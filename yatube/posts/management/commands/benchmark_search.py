@@ -0,0 +1,95 @@
+"""Замер поиска на растущей таблице постов.
+
+    python manage.py benchmark_search --sizes 10000,100000,1000000
+
+Команда добавляет синтетические посты до каждого размера из --sizes
+и замеряет первую страницу выдачи posts.search для редких слов, которые
+встречаются в одном и том же числе постов при любом размере таблицы,
+а для сравнения — LIKE-поиск, которым пользовалась админка. Всё
+выполняется в одной транзакции и в конце откатывается.
+"""
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+VOCABULARY = [f'слово{number}' for number in range(5000)]
+WORDS_PER_POST = 30
+MATCHES_PER_TERM = 10
+
+
+def percentile(timings, share):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+class Command(BaseCommand):
+    help = 'Показывает, как время поиска зависит от числа постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000')
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--batch', type=int, default=500)
+
+    def seed(self, author, count, texts):
+        posts = Post.objects.bulk_create(
+            [Post(author=author, text=next(texts)) for _ in range(count)],
+            batch_size=self.batch,
+        )
+        if search.backend() == search.PYTHON_BACKEND:
+            # bulk_create не отправляет сигналы, индексируем сами
+            for post in Post.objects.order_by('-pk')[:count]:
+                search.index_text(post.pk, post.text)
+        return posts
+
+    def texts(self, rng, terms):
+        for term in terms * MATCHES_PER_TERM:
+            yield f'{term} ' + ' '.join(rng.choices(VOCABULARY, k=10))
+        while True:
+            yield ' '.join(rng.choices(VOCABULARY, k=WORDS_PER_POST))
+
+    def measure(self, terms):
+        indexed, scanned = [], []
+        for term in terms:
+            started = time.perf_counter()
+            list(search.SearchResults(term)[:10])
+            indexed.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            list(Post.objects.filter(text__icontains=term)[:10])
+            scanned.append(time.perf_counter() - started)
+        return indexed, scanned
+
+    def handle(self, *args, **options):
+        self.batch = options['batch']
+        rng = random.Random(0)
+        terms = [f'редкое{number}' for number in range(options['queries'])]
+        texts = self.texts(rng, terms)
+        self.stdout.write(f'Поиск: {search.backend()}')
+        self.stdout.write(
+            f'{"постов":>10} {"индекс p50":>11} {"p99":>8} '
+            f'{"LIKE p50":>10} {"p99":>8}  (мс)'
+        )
+        with transaction.atomic():
+            author = User.objects.create_user(username='benchmark_search')
+            total = Post.objects.count()
+            for size in sorted(int(size) for size in
+                               options['sizes'].split(',')):
+                if size > total:
+                    self.seed(author, size - total, texts)
+                    total = size
+                indexed, scanned = self.measure(terms)
+                self.stdout.write(
+                    f'{total:>10} '
+                    f'{percentile(indexed, 0.5) * 1000:>11.2f} '
+                    f'{percentile(indexed, 0.99) * 1000:>8.2f} '
+                    f'{percentile(scanned, 0.5) * 1000:>10.2f} '
+                    f'{percentile(scanned, 0.99) * 1000:>8.2f}'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,148 @@
+"""Замер конкурентных чтений и записей SQLite с прагмами и без.
+
+    python manage.py benchmark_sqlite --threads 8 --seconds 5
+
+Во временном файле создаются таблицы постов и комментариев. Потоки со
+своими соединениями читают ленту и пишут комментарии так же, как
+add_comment с сигналами: транзакция читает пост, вставляет комментарий
+и увеличивает счётчик. Сначала всё идёт с настройками SQLite
+по умолчанию, затем с SQLITE_PRAGMAS и повтором записи (core.sqlite).
+Рабочая база не затрагивается.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas, retrying
+
+from .benchmark_search import percentile
+
+POSTS = 1000
+SCHEMA = '''
+CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT,
+                   comments_count INTEGER DEFAULT 0);
+CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER,
+                      text TEXT, created REAL);
+CREATE INDEX comment_post ON comment (post_id, created);
+'''
+READ_SQL = '''
+SELECT post.id, post.text, post.comments_count FROM post
+ORDER BY post.id DESC LIMIT 10 OFFSET ?
+'''
+
+
+def prepare(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    conn.executemany('INSERT INTO post (text) VALUES (?)',
+                     [(f'Пост {number}',) for number in range(POSTS)])
+    conn.commit()
+    conn.close()
+
+
+def write(conn, post_id):
+    conn.execute('BEGIN')
+    try:
+        conn.execute('SELECT comments_count FROM post WHERE id = ?',
+                     (post_id,)).fetchone()
+        conn.execute('INSERT INTO comment (post_id, text, created) '
+                     'VALUES (?, ?, ?)', (post_id, 'Комментарий', time.time()))
+        conn.execute('UPDATE post SET comments_count = comments_count + 1 '
+                     'WHERE id = ?', (post_id,))
+        conn.execute('COMMIT')
+    except sqlite3.Error:
+        conn.execute('ROLLBACK')
+        raise
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, pragmas, attempts, deadline, write_share, seed):
+        super().__init__()
+        self.path = path
+        self.pragmas = pragmas
+        self.attempts = attempts
+        self.deadline = deadline
+        self.write_share = write_share
+        self.rng = random.Random(seed)
+        self.reads = []
+        self.writes = []
+        self.errors = 0
+
+    def operation(self, conn):
+        if self.rng.random() >= self.write_share:
+            conn.execute(READ_SQL, (self.rng.randrange(100),)).fetchall()
+            return self.reads
+        post_id = self.rng.randrange(1, POSTS + 1)
+        retrying(lambda: write(conn, post_id), self.attempts,
+                 errors=(sqlite3.OperationalError,))
+        return self.writes
+
+    def run(self):
+        # Таймаут задаёт busy_timeout из прагм, у SQLite по умолчанию — 5 с
+        conn = sqlite3.connect(self.path, isolation_level=None,
+                               check_same_thread=False)
+        apply_pragmas(conn, self.pragmas)
+        while time.monotonic() < self.deadline:
+            started = time.perf_counter()
+            try:
+                timings = self.operation(conn)
+            except sqlite3.OperationalError:
+                self.errors += 1
+                continue
+            timings.append(time.perf_counter() - started)
+        conn.close()
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает конкурентную работу SQLite с прагмами и без.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--write-share', type=float, default=0.3)
+
+    def run(self, pragmas, attempts, options):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.sqlite3')
+            prepare(path)
+            deadline = time.monotonic() + options['seconds']
+            workers = [
+                Worker(path, pragmas, attempts, deadline,
+                       options['write_share'], seed)
+                for seed in range(options['threads'])
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        reads = [t for worker in workers for t in worker.reads]
+        writes = [t for worker in workers for t in worker.writes]
+        return {
+            'ops': (len(reads) + len(writes)) / options['seconds'],
+            'writes': len(writes) / options['seconds'],
+            'errors': sum(worker.errors for worker in workers),
+            'read_p99': percentile(reads or [0], 0.99) * 1000,
+            'write_p99': percentile(writes or [0], 0.99) * 1000,
+        }
+
+    def handle(self, *args, **options):
+        modes = (
+            ('по умолчанию', {}, 1),
+            ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS,
+             settings.SQLITE_WRITE_RETRIES + 1),
+        )
+        for name, pragmas, attempts in modes:
+            result = self.run(pragmas, attempts, options)
+            self.stdout.write(
+                f'{name:<16} {result["ops"]:>9.0f} оп/с  '
+                f'записей {result["writes"]:>7.0f}/с  '
+                f'ошибок {result["errors"]:>5}  '
+                f'p99 чтения {result["read_p99"]:>7.2f} мс  '
+                f'p99 записи {result["write_p99"]:>7.2f} мс'
+            )
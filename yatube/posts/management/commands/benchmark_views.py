@@ -0,0 +1,170 @@
+"""Замер задержки и числа SQL-запросов представлений posts.
+
+    python manage.py benchmark_views --requests 50 --output new.json
+    python manage.py benchmark_views --compare old.json --tolerance 0.2
+
+Для index, group_posts, profile, post_detail и follow_index замеряются
+первая страница и глубокая — по старой ссылке ?page=N и по курсору на
+ту же позицию. Запросы идут через тестовый клиент Django без сети,
+перед каждым кеш очищается (с --warm — нет). Результат сохраняется
+в JSON; с --compare команда завершается ошибкой, если p99 вырос больше
+чем на --tolerance или запросов стало больше.
+
+Данные готовит manage.py seed_benchmark.
+"""
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import AuthorStats, Group, Post, TimelineEntry
+from posts.paginator import CursorPaginator
+from posts.views import NUM_POSTS
+
+from .benchmark_search import percentile
+
+
+def feed_scenarios(name, url, posts, deep, user=None, **options):
+    """Первая страница, ?page=deep и курсор на ту же позицию."""
+    paginator = CursorPaginator(posts, NUM_POSTS, **options)
+    offset = (deep - 1) * NUM_POSTS - 1
+    last = paginator.cursor_queryset()[offset:offset + 1]
+    scenarios = {
+        f'{name}:shallow': (url, {}, user),
+        f'{name}:deep_page': (url, {'page': deep}, user),
+    }
+    if last:
+        scenarios[f'{name}:deep_cursor'] = (
+            url, {'cursor': paginator.cursor_after(last[0])}, user
+        )
+    return scenarios
+
+
+def scenarios(deep):
+    """Сценарии замера на самых крупных объектах базы."""
+    found = feed_scenarios('index', reverse('posts:index'),
+                           Post.objects.all(), deep)
+    group = (Group.objects.annotate(posts_total=Count('posts'))
+             .order_by('-posts_total', 'pk').first())
+    if group is not None:
+        found.update(feed_scenarios(
+            'group_posts',
+            reverse('posts:group_list', kwargs={'slug': group.slug}),
+            group.posts.all(), deep,
+        ))
+    stats = AuthorStats.objects.select_related('user').order_by(
+        '-posts_count').first()
+    if stats is not None:
+        found.update(feed_scenarios(
+            'profile',
+            reverse('posts:profile', kwargs={'username': stats.user}),
+            stats.user.posts.all(), deep,
+        ))
+    for name, post in (('shallow', Post.objects.order_by('-pk').first()),
+                       ('deep', Post.objects.order_by('pk').first()),
+                       ('commented',
+                        Post.objects.order_by('-comments_count').first())):
+        if post is not None:
+            found[f'post_detail:{name}'] = (
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+                {}, None,
+            )
+    entry = TimelineEntry.objects.select_related('user').first()
+    if entry is not None:
+        posts, options = timeline.feed(entry.user)
+        found.update(feed_scenarios(
+            'follow_index', reverse('posts:follow_index'), posts, deep,
+            user=entry.user, **options,
+        ))
+    return found
+
+
+def measure(url, params, user, requests, warm):
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+    client.get(url, params)
+    timings, queries, statuses = [], [], set()
+    for _ in range(requests):
+        if not warm:
+            cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url, params)
+            timings.append(time.perf_counter() - started)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+    return {
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 2),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 2),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        'queries': max(queries),
+        'statuses': sorted(statuses),
+    }
+
+
+def regressions(old, new, tolerance):
+    """Сценарии, где стало медленнее допуска или больше запросов."""
+    found = []
+    for name, result in new.items():
+        base = old.get(name)
+        if base is None:
+            continue
+        if result['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            found.append(f'{name}: p99 {base["p99_ms"]} -> '
+                         f'{result["p99_ms"]} мс')
+        if result['queries'] > base['queries']:
+            found.append(f'{name}: запросов {base["queries"]} -> '
+                         f'{result["queries"]}')
+    return found
+
+
+class Command(BaseCommand):
+    help = 'Замеряет p50/p99 и число запросов представлений posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--deep-page', type=int, default=100)
+        parser.add_argument('--warm', action='store_true')
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', metavar='BASELINE')
+        parser.add_argument('--tolerance', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, scenario in scenarios(options['deep_page']).items():
+            results[name] = measure(*scenario, options['requests'],
+                                    options['warm'])
+            result = results[name]
+            self.stdout.write(
+                f'{name:<28} p50 {result["p50_ms"]:>8.2f} мс  '
+                f'p99 {result["p99_ms"]:>8.2f} мс  '
+                f'запросов {result["queries"]:>3}'
+            )
+        report = {
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'requests': options['requests'],
+                'deep_page': options['deep_page'],
+                'warm': options['warm'],
+                'posts': Post.objects.count(),
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты: {options["output"]}')
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                old = json.load(baseline)['results']
+            found = regressions(old, results, options['tolerance'])
+            if found:
+                raise CommandError('Регрессии:\n' + '\n'.join(found))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
@@ -0,0 +1,79 @@
+"""Выгрузка постов в NDJSON или CSV (posts.transfer).
+
+    python manage.py export_posts posts.ndjson --media exported/media
+    python manage.py export_posts - --format csv --author leo > leo.csv
+
+Посты читаются курсором базы и пишутся по одному, так что память
+не растёт с числом постов. С --media картинки копируются пулом потоков
+в указанный каталог — его потом можно передать import_posts.
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+from posts.models import Post
+
+# Сколько копий картинок может ждать в очереди пула
+PENDING_COPIES = 1000
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты в NDJSON/CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdout')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument('--author', help='username автора')
+        parser.add_argument('--group', help='slug группы')
+        parser.add_argument('--media', metavar='DIR',
+                            help='Куда скопировать картинки')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def copy_images(self, records, executor, media):
+        """Передать записи дальше, отправив их картинки на копирование."""
+        pending = []
+        for record in records:
+            self.count += 1
+            if media and record['image']:
+                pending.append(executor.submit(
+                    transfer.export_image, record['image'], media
+                ))
+            if len(pending) >= PENDING_COPIES:
+                self.wait(pending)
+            yield record
+        self.wait(pending)
+
+    def wait(self, pending):
+        for future in pending:
+            try:
+                future.result()
+            except OSError as error:
+                self.stderr.write(f'Картинка не скопирована: {error}')
+        pending.clear()
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or transfer.guess_format(path)
+        posts = Post.objects.all()
+        if options['author']:
+            posts = posts.filter(author__username=options['author'])
+        if options['group']:
+            posts = posts.filter(group__slug=options['group'])
+        started = time.monotonic()
+        self.count = 0
+        stream = (nullcontext(sys.stdout) if path == '-'
+                  else open(path, 'w', encoding='utf-8', newline=''))
+        with stream as output, ThreadPoolExecutor(
+                options['workers']) as executor:
+            transfer.write_records(output, fmt, self.copy_images(
+                transfer.export_records(posts), executor, options['media']
+            ))
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено постов: {self.count} за {elapsed:.2f} с '
+            f'({self.count / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
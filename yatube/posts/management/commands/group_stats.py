@@ -0,0 +1,33 @@
+"""Пересчёт сводок групп для /groups/ и боковой панели (posts.counters).
+
+    python manage.py group_stats [--watch 300]
+
+С --watch команда не завершается, а пересчитывает сводки каждые
+N секунд.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает число постов, последнюю запись и авторов групп.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', type=float, metavar='SECONDS')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            with transaction.atomic():
+                groups = counters.recount_groups()
+            self.stdout.write(
+                f'Пересчитано групп: {groups} '
+                f'за {time.monotonic() - started:.2f} с'
+            )
+            if not options['watch']:
+                return
+            time.sleep(options['watch'])
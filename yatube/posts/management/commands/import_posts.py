@@ -0,0 +1,52 @@
+"""Массовая загрузка постов из NDJSON или CSV (posts.transfer).
+
+    python manage.py import_posts posts.ndjson --media exported/media
+    python manage.py import_posts - --format csv < posts.csv
+
+Посты вставляются пачками по --batch, каждая пачка в своей транзакции:
+прерванную загрузку можно продолжить, отрезав загруженные строки.
+Битые записи пропускаются, их номера выводятся в конце. Без --media
+имена картинок сохраняются как есть: файлы уже должны лежать в хранилище.
+"""
+import sys
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает посты из NDJSON/CSV пачками через bulk_create.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument('--format', choices=transfer.FORMATS)
+        parser.add_argument('--batch', type=int, default=1000)
+        parser.add_argument('--media', metavar='DIR',
+                            help='Каталог, относительно которого '
+                                 'указаны картинки')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or transfer.guess_format(path)
+        importer = transfer.Importer(options['batch'], options['media'],
+                                     options['workers'])
+        started = time.monotonic()
+        try:
+            stream = (nullcontext(sys.stdin) if path == '-'
+                      else open(path, encoding='utf-8', newline=''))
+        except OSError as error:
+            raise CommandError(error)
+        with stream as source:
+            importer.load(transfer.read_records(source, fmt))
+        elapsed = time.monotonic() - started
+        for number, error in importer.errors:
+            self.stderr.write(f'Запись {number}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено постов: {importer.imported}, '
+            f'пропущено: {len(importer.errors)} за {elapsed:.2f} с '
+            f'({importer.imported / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
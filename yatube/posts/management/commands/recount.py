@@ -0,0 +1,29 @@
+"""Пересчёт денормализованных счётчиков (posts.counters).
+
+    python manage.py recount
+
+Нужен после массовых операций в обход сигналов или для устранения
+расхождений, накопившихся по любой другой причине.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев.'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            authors = counters.recount_authors()
+            posts = counters.recount_posts()
+            groups = counters.recount_groups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано авторов: {authors}, постов: {posts}, '
+            f'групп: {groups} '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
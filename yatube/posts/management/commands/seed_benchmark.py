@@ -0,0 +1,139 @@
+"""Наполнение базы синтетическими данными для benchmark_views.
+
+    python manage.py seed_benchmark --users 100000 --posts 1000000 \\
+        --follows 10000000 --comments 1000000
+
+Пользователи, посты, подписки и комментарии вставляются bulk_create
+пачками в обход сигналов, тексты берутся из заранее сгенерированного
+Faker набора, группы создаёт mixer. Потом пересчитываются счётчики
+и собираются ленты подписок первых --timelines пользователей: разложить
+посты по лентам всех подписчиков на таких объёмах слишком дорого,
+а замеры всё равно идут от имени этих пользователей.
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import mixer
+
+from posts import counters, timeline
+from posts.models import Comment, Follow, Group, Post
+from posts.transfer import explicit_dates
+
+User = get_user_model()
+
+USERNAME = 'bench{}'
+TEXTS = 1000
+
+
+class Command(BaseCommand):
+    help = 'Создаёт большой набор данных для замеров производительности.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--timelines', type=int, default=100)
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def step(self, name, func, *args):
+        started = time.monotonic()
+        count = func(*args)
+        self.stdout.write(f'{name}: {count} за '
+                          f'{time.monotonic() - started:.1f} с')
+
+    def insert(self, model, objects):
+        """Вставить объекты из генератора пачками по --batch."""
+        count = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                count += len(batch)
+                batch = []
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+        return count + len(batch)
+
+    def seed_users(self, count):
+        first = User.objects.filter(username__startswith='bench').count()
+        return self.insert(User, (
+            User(username=USERNAME.format(number), password='!',
+                 first_name=self.faker.first_name(),
+                 last_name=self.faker.last_name())
+            for number in range(first, first + count)
+        ))
+
+    def seed_groups(self, count):
+        mixer.cycle(count).blend(Group)
+        return count
+
+    def seed_posts(self, count):
+        groups = list(Group.objects.values_list('pk', flat=True)) + [None]
+        now = timezone.now()
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            return self.insert(Post, (
+                Post(author_id=self.rng.choice(self.users),
+                     group_id=self.rng.choice(groups),
+                     text=self.rng.choice(self.texts),
+                     pub_date=now - timedelta(minutes=number))
+                for number in range(count)
+            ))
+
+    def seed_follows(self, count):
+        per_user = max(1, count // len(self.users))
+        per_user = min(per_user, len(self.users) - 1)
+
+        def follows():
+            for user_id in self.users:
+                for author_id in self.rng.sample(self.users, per_user):
+                    if author_id != user_id:
+                        yield Follow(user_id=user_id, author_id=author_id)
+        return self.insert(Follow, follows())
+
+    def seed_comments(self, count):
+        posts = list(Post.objects.values_list('pk', flat=True))
+        now = timezone.now()
+        with explicit_dates(Comment._meta.get_field('created')):
+            return self.insert(Comment, (
+                Comment(post_id=self.rng.choice(posts),
+                        author_id=self.rng.choice(self.users),
+                        text=self.rng.choice(self.texts),
+                        created=now - timedelta(seconds=number))
+                for number in range(count)
+            ))
+
+    def seed_timelines(self, count):
+        users = (User.objects.filter(username__startswith='bench')
+                 .order_by('pk')[:count])
+        for user in users:
+            timeline.rebuild(user)
+        return len(users)
+
+    def recount(self):
+        return counters.recount_authors() + counters.recount_posts()
+
+    def handle(self, *args, **options):
+        self.batch = options['batch']
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.texts = [self.faker.paragraph(nb_sentences=3)
+                      for _ in range(TEXTS)]
+        with transaction.atomic():
+            self.step('Пользователи', self.seed_users, options['users'])
+            self.users = list(User.objects.values_list('pk', flat=True))
+            self.step('Группы', self.seed_groups, options['groups'])
+            self.step('Посты', self.seed_posts, options['posts'])
+            self.step('Подписки', self.seed_follows, options['follows'])
+            self.step('Комментарии', self.seed_comments, options['comments'])
+            self.step('Счётчики', self.recount)
+            self.step('Ленты', self.seed_timelines, options['timelines'])
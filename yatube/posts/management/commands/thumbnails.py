@@ -0,0 +1,56 @@
+"""Нарезка миниатюр для постов, у которых их ещё нет (posts.thumbnails).
+
+    python manage.py thumbnails [--workers 4] [--watch 5]
+
+С --watch команда не завершается, а каждые N секунд проверяет,
+не появились ли новые посты с картинками.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+BATCH_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры картинок постов пулом потоков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--watch', type=float, metavar='SECONDS')
+
+    def process(self, executor, failed):
+        """Обработать очередь; посты с битыми файлами копятся в failed."""
+        done = 0
+        while True:
+            jobs = list(thumbnails.pending().exclude(pk__in=failed)
+                        .values_list('pk', 'image')[:BATCH_SIZE])
+            if not jobs:
+                return done
+            thumbnails.warm(name for _, name in jobs)
+            results = executor.map(
+                lambda job: thumbnails.run(*job, in_worker=True), jobs
+            )
+            for (pk, _), result in zip(jobs, results):
+                if result is None:
+                    failed.add(pk)
+                else:
+                    done += 1
+
+    def handle(self, *args, **options):
+        failed = set()
+        with ThreadPoolExecutor(options['workers']) as executor:
+            while True:
+                started = time.monotonic()
+                done = self.process(executor, failed)
+                if done or not options['watch']:
+                    self.stdout.write(
+                        f'Готово постов: {done} '
+                        f'за {time.monotonic() - started:.2f} с'
+                    )
+                if not options['watch']:
+                    return
+                time.sleep(options['watch'])
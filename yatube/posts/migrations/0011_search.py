@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from posts.search import install_fts, uninstall_fts
+
+
+def create_fts(apps, schema_editor):
+    install_fts(schema_editor.connection, rebuild=True)
+
+
+def drop_fts(apps, schema_editor):
+    uninstall_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.IntegerField()),
+                ('comment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Comment')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='search_term_post_idx'),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-17 10:00
+
+from django.db import migrations
+
+
+def reset_thumbnails(apps, schema_editor):
+    # Миниатюры в старом формате (одна ширина и её 2x) нарежет заново
+    # manage.py thumbnails
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(thumbnails='').update(thumbnails='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_image_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-17 10:30
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    # Активных авторов добавит первый запуск manage.py group_stats
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupStats.objects.bulk_create(
+        GroupStats(group_id=pk)
+        for pk in Group.objects.values_list('pk', flat=True)
+    )
+    posts = Post.objects.filter(group=OuterRef('group_id')).order_by()
+    GroupStats.objects.update(
+        posts_count=Coalesce(Subquery(
+            posts.values('group').annotate(total=Count('pk'))
+            .values('total')
+        ), Value(0)),
+        last_post_at=Subquery(
+            posts.order_by('-pub_date').values('pub_date')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_reset_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.IntegerField(default=0)),
+                ('last_post_at', models.DateTimeField(null=True)),
+                ('top_authors', models.TextField(default='[]')),
+                ('refreshed', models.DateTimeField(null=True)),
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='posts.Group')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupstats',
+            index=models.Index(fields=['-last_post_at', 'group'], name='group_stats_activity_idx'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-17 11:00
+
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_timelines(apps, schema_editor):
+    # Ленты существующих подписок: то же, что timeline.backfill при
+    # подписке, иначе follow_index пуст до переподписки
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    celebrities = set(AuthorStats.objects.filter(
+        followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).values_list('user_id', flat=True))
+    authors = (Follow.objects.exclude(author_id__in=celebrities)
+               .values_list('author_id', flat=True).distinct())
+    for author_id in authors.iterator():
+        posts = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by('-pub_date', '-pk')
+            .values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL_POSTS]
+        )
+        followers = Follow.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True)
+        for user_id in followers.iterator():
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user_id=user_id, post_id=pk, pub_date=date)
+                 for pk, date in posts],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_group_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
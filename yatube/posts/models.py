@@ -1,3 +1,5 @@
+import json
+
 from django.db import models
 
 from django.contrib.auth import get_user_model
@@ -27,12 +29,31 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Размеры картинки после обработки при загрузке (posts.uploads)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    # Денормализованный счётчик, поддерживается сигналами (posts.counters)
+    comments_count = models.IntegerField(default=0, editable=False)
+    # Адреса готовых миниатюр картинки в JSON (posts.thumbnails)
+    thumbnails = models.TextField(default='', editable=False)
+    # Меняется при любом изменении поста, входит в ключ кеша его карточки
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_pub_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date_idx'),
+            # Подсчёт ссылок на файл картинки (posts.uploads.release)
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
 
 class Group(models.Model):
@@ -52,9 +73,90 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, related_name='follower',
                              on_delete=models.CASCADE)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='following')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя, разложенный при публикации."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    # Копия Post.pub_date: лента сортируется по индексу этой таблицы
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_entry'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, поддерживаемые сигналами (posts.counters)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                related_name='stats')
+    posts_count = models.IntegerField(default=0)
+    followers_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+
+
+class GroupStats(models.Model):
+    """Сводка по группе, пересчитываемая периодически (posts.counters)."""
+    group = models.OneToOneField(Group, on_delete=models.CASCADE,
+                                 related_name='stats')
+    posts_count = models.IntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True)
+    # [[username, число постов], ...] самых активных авторов, JSON
+    top_authors = models.TextField(default='[]')
+    refreshed = models.DateTimeField(null=True)
+
+    def authors(self):
+        return json.loads(self.top_authors)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-last_post_at', 'group'],
+                         name='group_stats_activity_idx'),
+        ]
+
+
+class SearchTerm(models.Model):
+    """Запись запасного инвертированного индекса поиска (posts.search).
+
+    Используется, только когда в базе нет FTS5.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='search_terms')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE,
+                                null=True, related_name='search_terms')
+    frequency = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'post'],
+                         name='search_term_post_idx'),
+        ]
@@ -0,0 +1,215 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Целые в SQLite — 64-битные; большее число в курсоре не подходит ни к
+# одному ключу
+MAX_KEY = 2 ** 63 - 1
+
+
+class BoundedPaginator(Paginator):
+    """Пагинатор по номеру страницы без SELECT COUNT(*).
+
+    Страница читается одним запросом вместе со строками WINDOW + 1
+    страниц до неё и WINDOW страниц после: по ним видно, сколько страниц
+    впереди, и навигация показывает номера только рядом с текущей
+    (window). Если номер оказался за концом выдачи недалеко (устаревшая
+    ссылка), последняя страница находится среди строк до него. Общее
+    число страниц считается, лишь когда номер далеко за концом.
+    """
+
+    WINDOW = 2
+    window = ()
+    # Последняя страница попала в окно, num_pages — точное значение
+    exhausted = False
+    _known_pages = None
+
+    @property
+    def num_pages(self):
+        if self._known_pages is not None:
+            return self._known_pages
+        return super().num_pages
+
+    def get_page(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        bottom = (number - 1) * self.per_page
+        back = max(bottom - self.per_page * (self.WINDOW + 1), 0)
+        limit = self.per_page * (self.WINDOW + 1) + 1
+        # OFFSET больше 64 бит SQLite не примет: такой номер точно за концом
+        rows = (list(self.object_list[back:bottom + limit])
+                if bottom + limit <= MAX_KEY else [])
+        ahead = rows[bottom - back:]
+        if not ahead and number > 1:
+            if not rows:
+                # Номер далеко за концом выдачи: как Paginator,
+                # отдаём последнюю страницу, посчитав их число
+                page = super().get_page(number)
+                self._set_window(page.number, page.number, exhausted=True)
+                return page
+            number = -(-(back + len(rows)) // self.per_page)
+            self._set_window(number, number, exhausted=True)
+            start = (number - 1) * self.per_page - back
+            return self._get_page(rows[start:], number, self)
+        pages = -(-len(ahead) // self.per_page) - 1
+        self._set_window(number, number + max(pages, 0),
+                         exhausted=len(ahead) < limit)
+        return self._get_page(ahead[:self.per_page], number, self)
+
+    def _set_window(self, number, known_pages, exhausted):
+        self._known_pages = known_pages
+        self.exhausted = exhausted
+        self.window = range(max(1, number - self.WINDOW),
+                            min(known_pages, number + self.WINDOW) + 1)
+
+
+class CursorPaginator(BoundedPaginator):
+    """Keyset-пагинатор: страницы выбираются по (pub_date, id) без OFFSET.
+
+    Один экземпляр обслуживает одну страницу: после get_cursor_page()
+    курсоры соседних страниц лежат в next_cursor и previous_cursor,
+    а num_pages вычисляется без COUNT(*). get_page() по номеру страницы
+    (BoundedPaginator) оставлен для старых ссылок вида ?page=N.
+
+    ordering — поля сортировки в запросе, keys — атрибуты объектов
+    страницы с теми же значениями (по умолчанию совпадают с ordering).
+    Условие where накладывается в одном filter() с условием курсора,
+    чтобы оба использовали одно и то же соединение таблиц.
+    """
+
+    cursor_mode = False
+    default_ordering = ('-pub_date', '-pk')
+
+    def __init__(self, object_list, per_page, ordering=None, keys=None,
+                 where=None, **kwargs):
+        self.ordering = tuple(ordering or self.default_ordering)
+        self.keys = tuple(keys or (name.lstrip('-')
+                                   for name in self.ordering))
+        self.where = where or Q()
+        self.base = object_list.order_by(*self.ordering)
+        super().__init__(self.base.filter(self.where), per_page, **kwargs)
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.last_cursor = encode_cursor(PREVIOUS, None)
+
+    def cursor_queryset(self, cursor=None):
+        """Запрос строк, следующих за курсором, в порядке обхода.
+
+        Курсор, не подходящий к сортировке, вызывает ValidationError.
+        """
+        direction, values = decode_cursor(cursor)
+        queryset = self.object_list
+        if values is not None:
+            queryset = self.base.filter(
+                self.where & self._seek(values, direction == PREVIOUS)
+            )
+        if direction == PREVIOUS:
+            queryset = queryset.reverse()
+        return queryset
+
+    def get_cursor_page(self, cursor=None):
+        """Вернуть страницу, следующую за курсором (или первую)."""
+        direction, values = decode_cursor(cursor)
+        backwards = direction == PREVIOUS
+        try:
+            queryset = self.cursor_queryset(cursor)
+        except ValidationError:
+            return self.get_cursor_page()
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        del items[self.per_page:]
+        if backwards:
+            items.reverse()
+            if not items:
+                return self.get_cursor_page()
+            has_next, has_previous = values is not None, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        self.cursor_mode = True
+        if has_next:
+            self.next_cursor = encode_cursor(NEXT, self._key(items[-1]))
+        if has_previous and items:
+            self.previous_cursor = encode_cursor(
+                PREVIOUS, self._key(items[0])
+            )
+        number = 2 if has_previous else 1
+        self._known_pages = number + 1 if has_next else number
+        return self._get_page(items, number, self)
+
+    def cursor_after(self, obj):
+        """Курсор страницы, которая начинается сразу после obj."""
+        return encode_cursor(NEXT, self._key(obj))
+
+    def _fields(self):
+        meta = self.base.model._meta
+        for name, key in zip(self.ordering, self.keys):
+            field = meta.pk if key == 'pk' else meta.get_field(key)
+            yield name.lstrip('-'), field, name.startswith('-')
+
+    def _key(self, obj):
+        key = []
+        for name in self.keys:
+            value = getattr(obj, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            key.append(value)
+        return key
+
+    def _seek(self, values, backwards):
+        """Условие «строго после ключа» в порядке сортировки."""
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise ValidationError('Cursor does not match ordering.')
+        condition = Q()
+        bound = None
+        equal = {}
+        for (name, field, descending), value in zip(self._fields(), values):
+            value = self._cursor_value(field, value)
+            lookup = 'gt' if descending == backwards else 'lt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+            if bound is None:
+                # Избыточная граница по первому ключу даёт СУБД диапазон
+                # индекса, иначе глубокая страница читает индекс с начала
+                bound = Q(**{f'{name}__{lookup}e': value})
+        return bound & condition
+
+    @staticmethod
+    def _cursor_value(field, value):
+        """Значение ключа из курсора; чужое значение — ValidationError."""
+        if (isinstance(value, bool)
+                or not isinstance(value, (str, int, float))
+                or isinstance(value, int) and abs(value) > MAX_KEY):
+            raise ValidationError('Cursor value has a wrong type.')
+        try:
+            return field.to_python(value)
+        except (TypeError, ValueError, OverflowError) as error:
+            raise ValidationError('Cursor value is malformed.') from error
+
+
+def encode_cursor(direction, values):
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разобрать курсор; битый или пустой курсор означает первую страницу."""
+    if not cursor:
+        return NEXT, None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return NEXT, None
+    if direction not in (NEXT, PREVIOUS):
+        return NEXT, None
+    if values is not None and not isinstance(values, list):
+        return NEXT, None
+    return direction, values
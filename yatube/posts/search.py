@@ -0,0 +1,248 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+В SQLite с FTS5 текст индексируют виртуальные таблицы posts_post_fts
+и posts_comment_fts, которые синхронизируют триггеры. Без FTS5 (или при
+SEARCH_BACKEND = 'python') работает запасной инвертированный индекс:
+слова хранятся в SearchTerm и обновляются сигналами posts.signals,
+а ранжирование TF-IDF считается в Python.
+
+Пост находится, если все слова запроса есть в его тексте или в одном
+его комментарии; совпадения в комментариях весят вдвое меньше.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post, SearchTerm
+
+FTS_BACKEND = 'fts5'
+PYTHON_BACKEND = 'python'
+MAX_TERMS = 10
+COMMENT_WEIGHT = 0.5
+
+FTS_TABLES = {
+    'posts_post_fts': 'posts_post',
+    'posts_comment_fts': 'posts_comment',
+}
+FTS_SQL = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5('
+    "text, content='{table}', content_rowid='id', tokenize='unicode61')",
+    'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} '
+    'BEGIN INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} '
+    "BEGIN INSERT INTO {fts}({fts}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF text '
+    "ON {table} BEGIN INSERT INTO {fts}({fts}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    'INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END',
+]
+
+RANKED_SQL = '''
+    SELECT post_id, MIN(score) AS score FROM (
+        SELECT rowid AS post_id, bm25(posts_post_fts) AS score
+        FROM posts_post_fts WHERE posts_post_fts MATCH %s
+        UNION ALL
+        SELECT comment.post_id, bm25(posts_comment_fts) * %s
+        FROM posts_comment_fts
+        JOIN posts_comment AS comment
+            ON comment.id = posts_comment_fts.rowid
+        WHERE posts_comment_fts MATCH %s
+    ) GROUP BY post_id ORDER BY score, post_id DESC LIMIT %s OFFSET %s
+'''
+COUNT_SQL = '''
+    SELECT COUNT(*) FROM (
+        SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s
+        UNION
+        SELECT comment.post_id FROM posts_comment_fts
+        JOIN posts_comment AS comment
+            ON comment.id = posts_comment_fts.rowid
+        WHERE posts_comment_fts MATCH %s
+    )
+'''
+
+_fts_available = None
+
+
+def tokenize(text):
+    return [word[:64] for word in re.findall(r'\w+', text.lower())]
+
+
+def fts_supported(conn):
+    """Собран ли SQLite с FTS5."""
+    if conn.vendor != 'sqlite':
+        return False
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe '
+                           'USING fts5(text)')
+        except Exception:
+            return False
+        cursor.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+
+def install_fts(conn, rebuild=False):
+    """Создать FTS-таблицы и триггеры, если их нет.
+
+    Вызывается и после каждой миграции: SQLite пересоздаёт таблицу
+    при изменении схемы, и триггеры старой таблицы пропадают.
+    """
+    if not fts_supported(conn):
+        return False
+    with conn.cursor() as cursor:
+        for fts, table in FTS_TABLES.items():
+            for sql in FTS_SQL:
+                cursor.execute(sql.format(fts=fts, table=table))
+            if rebuild:
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    return True
+
+
+def uninstall_fts(conn):
+    with conn.cursor() as cursor:
+        for fts in FTS_TABLES:
+            cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def backend():
+    """Активный способ поиска: FTS_BACKEND или PYTHON_BACKEND."""
+    global _fts_available
+    if settings.SEARCH_BACKEND != 'auto':
+        return settings.SEARCH_BACKEND
+    if _fts_available is None:
+        _fts_available = (
+            'posts_post_fts' in connection.introspection.table_names()
+        )
+    return FTS_BACKEND if _fts_available else PYTHON_BACKEND
+
+
+def fts_query(terms):
+    """Слова запроса как фразы FTS5: операторы из запроса не работают."""
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def index_text(post_id, text, comment_id=None):
+    """Переиндексировать текст поста или комментария в SearchTerm."""
+    SearchTerm.objects.filter(post_id=post_id, comment_id=comment_id).delete()
+    SearchTerm.objects.bulk_create([
+        SearchTerm(term=term, post_id=post_id, comment_id=comment_id,
+                   frequency=frequency)
+        for term, frequency in Counter(tokenize(text)).items()
+    ])
+
+
+def rebuild():
+    """Заново построить индекс активного способа поиска."""
+    if backend() == FTS_BACKEND:
+        install_fts(connection, rebuild=True)
+        return
+    SearchTerm.objects.all().delete()
+    for post_id, text in Post.objects.values_list('pk', 'text').iterator():
+        index_text(post_id, text)
+    comments = Comment.objects.values_list('pk', 'post_id', 'text')
+    for comment_id, post_id, text in comments.iterator():
+        index_text(post_id, text, comment_id)
+
+
+class SearchResults:
+    """Ранжированная выдача; годится как object_list для Paginator."""
+
+    def __init__(self, query):
+        self.terms = tokenize(query)[:MAX_TERMS]
+        self._count = None
+        self._scores = None
+
+    def count(self):
+        if self._count is None:
+            if not self.terms:
+                self._count = 0
+            elif backend() == FTS_BACKEND:
+                self._count = self._fts_count()
+            else:
+                self._count = len(self._python_scores())
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        if not self.terms or stop is not None and stop <= start:
+            return []
+        if backend() == FTS_BACKEND:
+            ids = self._fts_ids(start, stop)
+        else:
+            ids = self._python_scores()[start:stop]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+    def _fts_ids(self, start, stop):
+        query = fts_query(self.terms)
+        limit = -1 if stop is None else stop - start
+        with connection.cursor() as cursor:
+            cursor.execute(RANKED_SQL,
+                           [query, COMMENT_WEIGHT, query, limit, start])
+            return [row[0] for row in cursor.fetchall()]
+
+    def _fts_count(self):
+        query = fts_query(self.terms)
+        with connection.cursor() as cursor:
+            cursor.execute(COUNT_SQL, [query, query])
+            return cursor.fetchone()[0]
+
+    def _python_scores(self):
+        """id постов по убыванию TF-IDF из запасного индекса."""
+        if self._scores is not None:
+            return self._scores
+        terms = set(self.terms)
+        # Число документов оценивается по наибольшим id: COUNT(*)
+        # просматривал бы весь индекс
+        total = sum(
+            model.objects.aggregate(last=Max('pk'))['last'] or 0
+            for model in (Post, Comment)
+        ) or 1
+        idf = {
+            row['term']: math.log(1 + total / row['df'])
+            for row in SearchTerm.objects.filter(term__in=terms)
+            .values('term').annotate(df=Count('pk'))
+        }
+        found = defaultdict(lambda: defaultdict(set))
+        scores = defaultdict(float)
+        rows = (SearchTerm.objects.filter(term__in=idf)
+                .values_list('post', 'comment', 'term', 'frequency'))
+        for post_id, comment_id, term, frequency in rows.iterator():
+            weight = 1 if comment_id is None else COMMENT_WEIGHT
+            found[post_id][comment_id].add(term)
+            scores[post_id, comment_id] += frequency * idf[term] * weight
+        best = {}
+        for post_id, texts in found.items():
+            for comment_id, matched in texts.items():
+                if matched == terms:
+                    score = scores[post_id, comment_id]
+                    best[post_id] = max(best.get(post_id, 0), score)
+        self._scores = sorted(best, key=lambda pk: (-best[pk], -pk))
+        return self._scores
+
+
+def matching_posts(query):
+    """Условие для Post.objects.filter(): текст поста подходит под запрос."""
+    terms = tokenize(query)[:MAX_TERMS]
+    if not terms:
+        return Q()
+    if backend() == FTS_BACKEND:
+        return Q(pk__in=RawSQL(
+            'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+            [fts_query(terms)],
+        ))
+    posts = (SearchTerm.objects.filter(term__in=terms, comment=None)
+             .values('post').annotate(matched=Count('term', distinct=True))
+             .filter(matched=len(set(terms))).values('post'))
+    return Q(pk__in=posts)
@@ -0,0 +1,182 @@
+from django.contrib.auth import get_user_model
+from django.db import connections, router
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_save,
+)
+from django.dispatch import receiver
+
+from . import caching, counters, search, thumbnails, timeline, uploads
+from .models import AuthorStats, Comment, Follow, Group, GroupStats, Post
+
+User = get_user_model()
+
+# Поля пользователя, которые выводятся на страницах с постами
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def post_scopes(post):
+    """Области кеша страниц, на которых виден пост."""
+    scopes = ['index', f'post:{post.pk}', f'profile:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    old_group = getattr(post, '_old_group_slug', None)
+    if old_group:
+        scopes.append(f'group:{old_group}')
+    return scopes
+
+
+def author_scopes(user):
+    """Области кеша чужих страниц, на которых видно имя пользователя."""
+    slugs = (Post.objects.filter(author=user).exclude(group=None)
+             .values_list('group__slug', flat=True).distinct())
+    commented = (Comment.objects.filter(author=user)
+                 .values_list('post_id', flat=True).distinct())
+    return ['index', *(f'group:{slug}' for slug in slugs),
+            *(f'post:{post_id}' for post_id in commented)]
+
+
+@receiver(pre_save, sender=User)
+def remember_names(sender, instance, raw=False, update_fields=None,
+                   **kwargs):
+    # Вход сохраняет только last_login: имена перечитывать незачем
+    if (not instance.pk or raw or update_fields is not None
+            and set(NAME_FIELDS).isdisjoint(update_fields)):
+        return
+    instance._old_names = (User.objects.filter(pk=instance.pk)
+                           .values_list(*NAME_FIELDS).first())
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+    scopes = [f'profile:{instance.username}']
+    old_names = getattr(instance, '_old_names', None)
+    names = tuple(getattr(instance, field) for field in NAME_FIELDS)
+    if old_names and old_names != names:
+        scopes += [f'profile:{old_names[0]}', *author_scopes(instance)]
+    caching.bump(*scopes)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    caching.bump(f'profile:{instance.username}')
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._old_group_slug, old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group__slug', 'image').first()
+            or (None, None)
+        )
+        instance._new_image = old_image != instance.image.name
+        instance._old_image = old_image
+        if instance._new_image:
+            instance.thumbnails = ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_author(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+    if created or getattr(instance, '_new_image', False):
+        thumbnails.schedule(instance)
+    if getattr(instance, '_new_image', False):
+        uploads.release(instance._old_image)
+    if search.backend() == search.PYTHON_BACKEND:
+        search.index_text(instance.pk, instance.text)
+    caching.bump(*post_scopes(instance))
+
+
+@receiver(thumbnails.thumbnails_ready)
+def thumbnails_ready(sender, post_id, **kwargs):
+    # Страницы с исходной картинкой вместо миниатюры пора перерисовать
+    post = Post.objects.select_related('author', 'group').get(pk=post_id)
+    caching.bump(*post_scopes(post))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, posts_count=-1)
+    uploads.release(instance.image.name)
+    caching.bump(*post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+    if search.backend() == search.PYTHON_BACKEND:
+        search.index_text(instance.post_id, instance.text, instance.pk)
+    caching.bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    caching.bump(f'post:{instance.post_id}')
+
+
+def moved_group_scopes(group, old_slug):
+    """Области кеша со ссылками на прежний адрес группы.
+
+    Карточки постов перерисуются сами: адрес группы входит в их ключ.
+    """
+    authors = (Post.objects.filter(group=group)
+               .values_list('author__username', flat=True).distinct())
+    return [f'group:{old_slug}',
+            *(f'profile:{username}' for username in authors)]
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._old_slug = (Group.objects.filter(pk=instance.pk)
+                              .values_list('slug', flat=True).first())
+
+
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, instance, raw=False, created=False, **kwargs):
+    if raw:
+        return
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+    scopes = ['index', f'group:{instance.slug}', 'groups']
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug and old_slug != instance.slug:
+        scopes += moved_group_scopes(instance, old_slug)
+    caching.bump(*scopes)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_author(instance.author_id, followers_count=1)
+        counters.bump_author(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        caching.bump(f'profile:{instance.author.username}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.bump_author(instance.author_id, followers_count=-1)
+    counters.bump_author(instance.user_id, following_count=-1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.demote(instance.author_id)
+    caching.bump(f'profile:{instance.author.username}')
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # На реплики таблицы не мигрируются, индекс туда копирует репликация
+    if sender.name == 'posts' and router.allow_migrate(using, 'posts'):
+        search.install_fts(connections[using])
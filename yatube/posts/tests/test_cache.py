@@ -0,0 +1,225 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.cache import LOCK_KEY, get_or_set
+from core.templatetags.post_cards import card_key
+
+from .. import caching
+from ..models import Group, Post, User
+
+
+class StampedeProtectionTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def produce(self, value='новое', delay=0):
+        def producer():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return producer
+
+    def test_concurrent_misses_compute_once(self):
+        producer = self.produce(delay=0.2)
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(get_or_set('k', producer, 60))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['новое'] * 5)
+
+    def test_expired_value_is_served_while_locked(self):
+        cache.set('k', ('старое', time.time() - 1, 0.1))
+        cache.add(LOCK_KEY.format('k'), 1)
+        self.assertEqual(get_or_set('k', self.produce(), 60), 'старое')
+        self.assertEqual(self.calls, 0)
+
+    @override_settings(CACHE_LOCK_TIMEOUT=0.1)
+    def test_wait_timeout_keeps_foreign_lock(self):
+        lock = LOCK_KEY.format('k')
+        cache.add(lock, 'чужая')
+        self.assertEqual(get_or_set('k', self.produce(), 60), 'новое')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.get(lock), 'чужая')
+
+    def test_early_expiry_depends_on_luck(self):
+        cache.set('k', ('старое', time.time() + 5, 1.0))
+        with mock.patch('core.cache.random.random', return_value=0.0):
+            self.assertEqual(get_or_set('k', self.produce(), 60), 'старое')
+        with mock.patch('core.cache.random.random', return_value=0.999):
+            self.assertEqual(get_or_set('k', self.produce(), 60), 'новое')
+        self.assertEqual(self.calls, 1)
+
+    def test_cacheable_rejects_value(self):
+        get_or_set('k', self.produce(None), 60, cacheable=bool)
+        get_or_set('k', self.produce(None), 60, cacheable=bool)
+        self.assertEqual(self.calls, 2)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='carded')
+        cls.posts = [Post.objects.create(author=cls.author, text=f'Пост {i}')
+                     for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def cards(self):
+        return {post.pk: card_key(post, 'index')
+                for post in Post.objects.select_related('author')}
+
+    def test_edit_invalidates_only_its_card(self):
+        self.client.get(reverse('posts:index'))
+        before = self.cards()
+        self.assertEqual(len(cache.get_many(before.values())), 3)
+        edited = self.posts[0]
+        self.client.post(
+            reverse('posts:post_edit', kwargs={'post_id': edited.pk}),
+            {'text': 'Исправленный'},
+        )
+        after = self.cards()
+        self.assertNotEqual(after[edited.pk], before[edited.pk])
+        for pk in after:
+            if pk != edited.pk:
+                self.assertEqual(after[pk], before[pk])
+        cache.set(before[self.posts[1].pk], 'из кеша')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Исправленный')
+        self.assertContains(response, 'из кеша')
+        self.assertIn(after[edited.pk], cache.get_many(after.values()))
+
+    def test_comment_keeps_card(self):
+        self.client.get(reverse('posts:index'))
+        before = self.cards()
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.posts[1].pk}),
+            {'text': 'Комментарий'},
+        )
+        self.assertEqual(self.cards(), before)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='validated')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_unchanged_page_is_not_rendered_again(self):
+        url = reverse('posts:index')
+        first = self.client.get(url)
+        self.assertEqual(first['Cache-Control'], 'no-cache')
+        self.assertGreater(len(first.content), 0)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(again.templates, [])
+        self.assertIn('tpl;dur=0.0', again['Server-Timing'])
+        since = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']
+        )
+        self.assertEqual(since.status_code, 304)
+
+    def test_write_changes_validators(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        tags = {url: self.client.get(url)['ETag'] for url in urls}
+        Post.objects.create(author=self.author, text='Новый')
+        self.post.comments.create(author=self.author, text='Комментарий')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=tags[url])
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], tags[url])
+
+    def test_pages_with_cookies_have_own_etag(self):
+        url = reverse('posts:index')
+        anonymous = self.client.get(url)
+        self.client.force_login(self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+        since = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=anonymous['Last-Modified']
+        )
+        self.assertEqual(since.status_code, 200)
+
+
+class ScopeInvalidationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug='old-slug')
+        cls.author = User.objects.create_user(username='writer',
+                                              first_name='Старое')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Пост')
+        cls.post.comments.create(author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.group.refresh_from_db()
+
+    def test_name_change_refreshes_pages(self):
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        self.assertContains(self.client.get(post_url), 'reader')
+        self.reader.username = 'renamed'
+        self.reader.save()
+        self.assertContains(self.client.get(post_url), 'renamed')
+        urls = (reverse('posts:index'),
+                reverse('posts:group_list', args=[self.group.slug]))
+        for url in urls:
+            self.assertContains(self.client.get(url), 'Старое')
+        self.author.first_name = 'Новое'
+        self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новое')
+
+    def test_login_keeps_pages(self):
+        version = caching.scope_version(['index', 'group:old-slug'])
+        self.client.force_login(self.author)
+        self.assertEqual(
+            caching.scope_version(['index', 'group:old-slug']), version
+        )
+
+    def test_slug_change_refreshes_pages(self):
+        old_url = reverse('posts:group_list', args=['old-slug'])
+        index_url = reverse('posts:index')
+        self.assertEqual(self.client.get(old_url).status_code, 200)
+        self.assertContains(self.client.get(index_url), old_url)
+        updated = Post.objects.get(pk=self.post.pk).updated
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).updated, updated)
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        self.assertContains(
+            self.client.get(index_url),
+            reverse('posts:group_list', args=['new-slug'])
+        )
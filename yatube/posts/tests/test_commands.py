@@ -0,0 +1,221 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.management.commands.compress_static import compressors
+
+from ..management.commands.audit_indexes import problems
+from ..management.commands.benchmark_views import scenarios
+from ..models import Follow, Group, Post, TimelineEntry, User
+from ..transfer import explicit_dates
+
+
+class AuditIndexesCommandTest(TestCase):
+    def test_view_queries_use_indexes(self):
+        out = StringIO()
+        call_command('audit_indexes', stdout=out)
+        self.assertIn('post_detail: comments: cursor page: ok', out.getvalue())
+        self.assertIn('group_index: page: ok', out.getvalue())
+
+    def test_full_scan_is_reported(self):
+        _, found = problems(Post.objects.filter(text='без индекса'))
+        self.assertTrue(found)
+
+    def test_follow_is_unique(self):
+        user = User.objects.create_user(username='follower')
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+
+
+class BenchmarkCommandsTest(TestCase):
+    def test_seed_and_benchmark_views(self):
+        call_command('seed_benchmark', users=20, posts=60, follows=60,
+                     comments=30, groups=2, timelines=5, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 60)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'new.json')
+            call_command('benchmark_views', requests=2, deep_page=2,
+                         output=output, stdout=StringIO())
+            with open(output) as report:
+                results = json.load(report)['results']
+            for name in ('index:shallow', 'index:deep_cursor',
+                         'group_posts:deep_page', 'profile:shallow',
+                         'post_detail:deep', 'follow_index:shallow'):
+                self.assertEqual(results[name]['statuses'], [200])
+            baseline = os.path.join(directory, 'old.json')
+            results['index:shallow']['queries'] = 0
+            with open(baseline, 'w') as report:
+                json.dump({'results': results}, report)
+            with self.assertRaisesMessage(CommandError, 'index:shallow'):
+                call_command('benchmark_views', requests=1, deep_page=2,
+                             output=output, compare=baseline,
+                             stdout=StringIO())
+
+    def test_benchmark_takes_largest_group(self):
+        author = User.objects.create_user(username='benchmark')
+        small = Group.objects.create(title='Малая', slug='small')
+        large = Group.objects.create(title='Большая', slug='large')
+        # Самый старый пост — в малой группе
+        for group in (small, large, large, large):
+            Post.objects.create(author=author, group=group, text='Пост')
+        url, _, _ = scenarios(2)['group_posts:shallow']
+        self.assertEqual(url, reverse('posts:group_list',
+                                      kwargs={'slug': large.slug}))
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferCommandsTest(TestCase):
+    SMALL_GIF = (
+        b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21'
+        b'\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00'
+        b'\x01\x00\x00\x02\x01\x00\x00\x3b'
+    )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='exported')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group = Group.objects.create(title='Группа', slug='moved',
+                                          description='')
+        self.image = default_storage.save('posts/moved.gif',
+                                          ContentFile(self.SMALL_GIF))
+        for i in range(3):
+            Post.objects.create(author=self.author, group=self.group,
+                                text=f'Пост {i}',
+                                image=self.image if i else '')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def snapshot(self):
+        return list(Post.objects.order_by('pub_date').values_list(
+            'text', 'pub_date', 'author__username', 'group__slug'
+        ))
+
+    def test_round_trip(self):
+        path = os.path.join(self.directory, 'posts.ndjson')
+        media = os.path.join(self.directory, 'media')
+        call_command('export_posts', path, media=media, stderr=StringIO())
+        expected = self.snapshot()
+        Post.objects.all().delete()
+        default_storage.delete(self.image)
+        out = StringIO()
+        call_command('import_posts', path, media=media, batch=2, stdout=out)
+        self.assertIn('Загружено постов: 3, пропущено: 0', out.getvalue())
+        self.assertEqual(self.snapshot(), expected)
+        for post in Post.objects.exclude(image=''):
+            self.assertTrue(default_storage.exists(post.image.name))
+        self.author.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.posts_count, 3)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+
+    def test_csv_creates_authors_and_groups(self):
+        path = os.path.join(self.directory, 'posts.csv')
+        with open(path, 'w', newline='') as source:
+            writer = csv.writer(source)
+            writer.writerow(('text', 'pub_date', 'author', 'group'))
+            writer.writerow(('Новый', '2020-01-02T03:04:05', 'newcomer',
+                             'fresh'))
+            writer.writerow(('Без автора', '', '', ''))
+            writer.writerow(('Старый автор', 'вчера', 'exported', ''))
+        err = StringIO()
+        call_command('import_posts', path, stdout=StringIO(), stderr=err)
+        post = Post.objects.get(text='Новый')
+        self.assertEqual(post.author.username, 'newcomer')
+        self.assertEqual(post.group.slug, 'fresh')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertIn('Запись 2', err.getvalue())
+        self.assertIn('Запись 3', err.getvalue())
+
+    def test_records_of_wrong_types_are_skipped(self):
+        path = os.path.join(self.directory, 'posts.ndjson')
+        records = [
+            {'text': 'Объект', 'author': {'username': 'x'}},
+            {'text': 'Список', 'author': ['x']},
+            {'text': 'Число', 'author': 'exported', 'pub_date': 20200102},
+            {'text': 'Дата', 'author': 'exported', 'pub_date': '2020-13-45'},
+            {'text': 'Группа', 'author': 'exported', 'group': 5},
+            {'text': 'Верный', 'author': 'exported'},
+        ]
+        with open(path, 'w') as source:
+            for record in records:
+                source.write(json.dumps(record, ensure_ascii=False) + '\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_posts', path, stdout=out, stderr=err)
+        self.assertIn('Загружено постов: 1, пропущено: 5', out.getvalue())
+        for number in range(1, 6):
+            self.assertIn(f'Запись {number}:', err.getvalue())
+        self.assertTrue(Post.objects.filter(text='Верный').exists())
+
+    def test_explicit_dates_affect_only_current_thread(self):
+        field = Post._meta.get_field('pub_date')
+        date = timezone.make_aware(datetime(2020, 1, 2), timezone.utc)
+        seen = []
+
+        def other_thread():
+            seen.append(field.pre_save(Post(pub_date=date), add=True))
+
+        with explicit_dates(field):
+            self.assertEqual(field.pre_save(Post(pub_date=date), True), date)
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            thread.join()
+        self.assertNotEqual(seen[0], date)
+        self.assertNotEqual(field.pre_save(Post(pub_date=date), True), date)
+        with self.assertRaises(ZeroDivisionError):
+            with explicit_dates(field):
+                1 / 0
+        self.assertNotEqual(field.pre_save(Post(pub_date=date), True), date)
+
+
+class CompressStaticTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'css'))
+        self.style = os.path.join(self.root, 'css', 'style.css')
+        with open(self.style, 'w') as style:
+            style.write('body { margin: 0; }\n' * 100)
+        with open(os.path.join(self.root, 'tiny.js'), 'w') as script:
+            script.write('1;')
+
+    def test_compressed_copies(self):
+        with override_settings(STATIC_ROOT=self.root):
+            out = StringIO()
+            call_command('compress_static', stdout=out)
+            self.assertIn(f'Сжато копий: {len(compressors())}',
+                          out.getvalue())
+            with gzip.open(self.style + '.gz', 'rt') as copy:
+                self.assertEqual(copy.read(), 'body { margin: 0; }\n' * 100)
+            self.assertFalse(
+                os.path.exists(os.path.join(self.root, 'tiny.js.gz'))
+            )
+            out = StringIO()
+            call_command('compress_static', stdout=out)
+            self.assertIn('Сжато копий: 0', out.getvalue())
@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import AuthorStats, Comment, Follow, Post, User
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_counter_follows_creates_and_deletes(self):
+        post = Post.objects.create(author=self.author, text='Раз')
+        Post.objects.create(author=self.author, text='Два')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_follow_counters(self):
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        follow.delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_comment_counter(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_profile_does_not_count_posts(self):
+        Post.objects.create(author=self.author, text='Пост')
+        with self.assertNumQueries(2):
+            response = Client().get(
+                reverse('posts:profile', kwargs={'username': self.author}))
+        self.assertEqual(response.context['count'], 1)
+
+    def test_recount_fixes_drift(self):
+        Post.objects.bulk_create([Post(author=self.author, text='Тихо')])
+        AuthorStats.objects.filter(user=self.reader).delete()
+        Follow.objects.create(user=self.author, author=self.reader)
+        call_command('recount', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).followers_count, 1)
+        self.assertEqual(self.stats(self.author).following_count, 1)
@@ -1,5 +1,10 @@
 import shutil
 import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
 
 from ..models import Post, Group, User, Comment
 from django.test import Client, TestCase, override_settings
@@ -8,6 +13,8 @@ from django.urls import reverse
 from http import HTTPStatus
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from .. import uploads
+from ..forms import PostForm
 
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -73,11 +80,52 @@ class PostFormTests(TestCase):
         self.assertEqual(Post.objects.count(), post_count + 1)
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group_id, form_data['group'])
-        self.assertTrue(
-            Post.objects.filter(
-                text=post.text,
-                image='posts/' + form_data['image'].name
-            ).exists())
+        # Картинка пережата в формат из IMAGE_FORMATS
+        self.assertTrue(post.image.name.endswith(
+            uploads.EXTENSIONS[uploads.encoder()]
+        ))
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+
+    @override_settings(IMAGE_MAX_SIDE=64, IMAGE_FORMATS=('JPEG',))
+    def test_large_image_is_resized_and_stripped(self):
+        photo = BytesIO()
+        exif = Image.Exif()
+        exif[0x0110] = 'Phone'
+        Image.new('RGB', (300, 150), 'red').save(photo, 'JPEG', exif=exif)
+        upload = SimpleUploadedFile('photo.jpeg', photo.getvalue(),
+                                    'image/jpeg')
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': upload},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image_width, post.image_height), (64, 32))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (64, 32))
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(IMAGE_WORKERS=0)
+    def test_broken_image_is_rejected(self):
+        upload = SimpleUploadedFile('broken.gif', self.small_gif[:20],
+                                    'image/gif')
+        form = PostForm({'text': 'Битая'}, {'image': upload})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    @override_settings(IMAGE_WORKERS=1)
+    def test_broken_pool_is_replaced(self):
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        upload = SimpleUploadedFile('small.gif', self.small_gif,
+                                    'image/gif')
+        with mock.patch.object(uploads, '_executor', broken):
+            form = PostForm({'text': 'Без пула'}, {'image': upload})
+            self.assertFalse(form.is_valid())
+            self.assertIn('image', form.errors)
+            self.assertIsNone(uploads._executor)
+        broken.shutdown.assert_called_once_with(wait=False)
 
     def test_edit_post(self):
         """Проверка редактирования записи авторизированным клиентом."""
@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+from ..models import Post, User
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='measured')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_server_timing_header(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        timing = response['Server-Timing']
+        # Промахи: страница и фрагмент с первыми комментариями
+        parts = ('db;dur=', 'SQL"', 'tpl;dur=', 'cache;desc="hit=0 miss=2"',
+                 'total;dur=')
+        for part in parts:
+            self.assertIn(part, timing)
+        again = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertIn('cache;desc="hit=1 miss=0"', again['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4')
+        body = response.content.decode()
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="posts:index",le="+Inf"}', body)
+        self.assertIn('yatube_responses_total'
+                      '{view="posts:index",status="200"}', body)
+        self.assertIn('yatube_request_sql_queries_count'
+                      '{view="posts:index"}', body)
+        self.assertIn('yatube_cache_requests_total'
+                      '{result="miss",view="posts:index"}', body)
+
+    def test_metrics_closed_for_other_addresses(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.1', '172.16.0.0/12'])
+    def test_metrics_open_for_allowed_networks(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='172.18.0.5')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='192.168.0.5')
+        self.assertEqual(response.status_code, 403)
+
+
+class SharedMetricsTest(TestCase):
+    """Сумма метрик воркеров через METRICS_DIR."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.settings = override_settings(METRICS_DIR=self.directory)
+        self.settings.enable()
+        self.addCleanup(self.settings.disable)
+        metrics._flushed['at'] = None
+        self.addCleanup(metrics._flushed.update, at=None)
+
+    def worker_file(self, pid, responses):
+        labels = [['view', 'other:view'], ['status', 200]]
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as f:
+            json.dump({metrics.RESPONSES.name: [[labels, responses]]}, f)
+
+    def total(self):
+        line = 'yatube_responses_total{view="other:view",status="200"} '
+        for row in metrics.exposition().splitlines():
+            if row.startswith(line):
+                return float(row[len(line):])
+        return None
+
+    def test_workers_are_summed_and_dead_ones_archived(self):
+        # Живой «воркер» — родительский процесс, завершившийся — дочерний
+        live = os.getppid()
+        finished = subprocess.run([sys.executable, '-c', 'import os; '
+                                   'print(os.getpid())'],
+                                  capture_output=True, check=True)
+        dead = int(finished.stdout)
+        self.worker_file(live, 2)
+        self.worker_file(dead, 3)
+        self.assertEqual(self.total(), 5)
+        names = os.listdir(self.directory)
+        self.assertIn(metrics.ARCHIVE, names)
+        self.assertNotIn(f'{dead}.json', names)
+        self.assertIn(f'{os.getpid()}.json', names)
+        # Счётчик не откатывается, когда живой воркер пишет новое значение
+        self.worker_file(live, 4)
+        self.assertEqual(self.total(), 7)
@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+
+from core import replicas
+from core.metrics import MetricsMiddleware
+from core.queries import QueryBudgetExceeded, query_budget
+
+from ..models import Group, Post, User
+
+REPLICAS = ['replica1', 'replica2']
+
+
+def read_view(request):
+    return HttpResponse(router.db_for_read(Post))
+
+
+def write_view(request):
+    router.db_for_write(Post)
+    return HttpResponse(router.db_for_read(Post))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def call(self, view, **cookies):
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies)
+        return replicas.ReplicaMiddleware(view)(request)
+
+    def test_reads_go_to_replicas(self):
+        response = self.call(read_view)
+        self.assertIn(response.content.decode(), REPLICAS)
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+    def test_reads_stick_to_primary_after_write(self):
+        response = self.call(write_view)
+        self.assertEqual(response.content, b'default')
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        again = self.call(read_view, **{replicas.STICKY_COOKIE: '1'})
+        self.assertEqual(again.content, b'default')
+        self.assertIn(self.call(read_view).content.decode(), REPLICAS)
+
+    def test_use_primary(self):
+        response = self.call(replicas.use_primary(read_view))
+        self.assertEqual(response.content, b'default')
+
+    def test_recently_changed_data_read_from_primary(self):
+        def view(request, written_at):
+            with replicas.after_write(written_at):
+                return read_view(request)
+
+        response = self.call(lambda request: view(request, time.time_ns()))
+        self.assertEqual(response.content, b'default')
+        response = self.call(
+            lambda request: view(request, time.time_ns() - 60 * 10 ** 9)
+        )
+        self.assertIn(response.content.decode(), REPLICAS)
+
+    def test_writes_and_migrations_on_primary(self):
+        self.assertEqual(self.call(write_view).content, b'default')
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.call(read_view).content, b'default')
+        self.assertNotIn(replicas.STICKY_COOKIE,
+                         self.call(write_view).cookies)
+
+
+def slugs_view(request):
+    # Несколько чтений одного запроса: каждое видит метку своей базы
+    seen = {Group.objects.get().slug for _ in range(5)}
+    return HttpResponse(','.join(sorted(seen)))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaDatabasesTest(TransactionTestCase):
+    """Чтения на настоящих репликах — файлах SQLite из sync_replicas.
+
+    Базы реплик подключаются только на время этих тестов: в DATABASES
+    их нет, и тестовые базы для них не создаются.
+    """
+    databases = {'default', *REPLICAS}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        for alias in REPLICAS:
+            connections.databases[alias] = {
+                **connections.databases['default'],
+                'NAME': os.path.join(cls.replica_dir, f'{alias}.sqlite3'),
+                'TEST': {},
+            }
+            connections.ensure_defaults(alias)
+            connections.prepare_test_settings(alias)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in REPLICAS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.replica_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='auth')
+        call_command('sync_replicas', stdout=StringIO())
+
+    def call(self, view, **cookies):
+        request = self.factory.get('/')
+        request.COOKIES.update(cookies)
+        return replicas.ReplicaMiddleware(view)(request)
+
+    def test_one_replica_per_request(self):
+        for alias in REPLICAS:
+            Group.objects.using(alias).bulk_create(
+                [Group(title=alias, slug=alias)]
+            )
+        used = {self.call(slugs_view).content.decode()
+                for _ in range(30)}
+        self.assertEqual(used, set(REPLICAS))
+
+    def test_read_your_write(self):
+        def write_and_read(request):
+            Post.objects.create(text='Новый пост', author=self.user)
+            return read_new(request)
+
+        def read_new(request):
+            exists = Post.objects.filter(text='Новый пост').exists()
+            return HttpResponse(str(exists))
+
+        response = self.call(write_and_read)
+        self.assertEqual(response.content, b'True')
+        # Реплики ещё не получили пост, но автор читает с основной
+        sticky = {replicas.STICKY_COOKIE: '1'}
+        self.assertEqual(self.call(read_new, **sticky).content, b'True')
+        self.assertEqual(self.call(read_new).content, b'False')
+        call_command('sync_replicas', stdout=StringIO())
+        self.assertEqual(self.call(read_new).content, b'True')
+
+    @override_settings(QUERY_BUDGET_STRICT=True,
+                       METRICS_SERVER_TIMING=True)
+    def test_replica_reads_are_counted(self):
+        @query_budget(1)
+        def view(request):
+            list(Post.objects.all())
+            list(Group.objects.all())
+            return HttpResponse(router.db_for_read(Post))
+
+        with self.assertRaises(QueryBudgetExceeded):
+            self.call(view)
+        response = MetricsMiddleware(
+            lambda request: self.call(query_budget(2)(view.__wrapped__))
+        )(self.factory.get('/'))
+        self.assertIn(response.content.decode(), REPLICAS)
+        self.assertIn('desc="2 SQL"', response['Server-Timing'])
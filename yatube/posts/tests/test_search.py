@@ -0,0 +1,87 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post, User
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='searcher')
+        cls.in_text = Post.objects.create(
+            author=cls.user, text='Рыжая кошка спит, кошка мурлычет')
+        cls.in_comment = Post.objects.create(
+            author=cls.user, text='Фото с дачи')
+        Comment.objects.create(post=cls.in_comment, author=cls.user,
+                               text='Какая рыжая кошка!')
+        cls.other = Post.objects.create(author=cls.user, text='Собака')
+
+    def found(self, query):
+        return list(search.SearchResults(query)[:10])
+
+    def check_backend(self):
+        self.assertEqual(self.found('КОШКА'), [self.in_text, self.in_comment])
+        self.assertEqual(self.found('рыжая кошка спит'), [self.in_text])
+        self.assertEqual(self.found('кошка собака'), [])
+        self.assertEqual(search.SearchResults('кошка').count(), 2)
+        self.assertEqual(
+            list(Post.objects.filter(search.matching_posts('кошка'))),
+            [self.in_text],
+        )
+
+    def test_fts_backend(self):
+        self.assertEqual(search.backend(), search.FTS_BACKEND)
+        self.check_backend()
+
+    @override_settings(SEARCH_BACKEND=search.PYTHON_BACKEND)
+    def test_python_backend(self):
+        search.rebuild()
+        self.check_backend()
+
+    @override_settings(SEARCH_BACKEND=search.PYTHON_BACKEND)
+    def test_python_index_follows_edits(self):
+        post = Post.objects.create(author=self.user, text='Попугай')
+        self.assertEqual(self.found('попугай'), [post])
+        post.text = 'Черепаха'
+        post.save()
+        self.assertEqual(self.found('попугай'), [])
+        post.delete()
+        self.assertEqual(self.found('черепаха'), [])
+
+    def test_fts_index_follows_edits(self):
+        self.other.text = 'Собака и кошка'
+        self.other.save()
+        self.assertIn(self.other, self.found('кошка'))
+        self.other.delete()
+        self.assertEqual(self.found('собака'), [])
+
+    def test_operators_in_query_are_words(self):
+        self.assertEqual(self.found('кошка" OR "собака'), [])
+        self.assertEqual(self.found('*'), [])
+
+    def test_search_page_is_paginated(self):
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Кошка номер {i}')
+            for i in range(12)
+        ])
+        response = Client().get(reverse('posts:search'), {'q': 'кошка'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 14)
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0'
+                                      '&amp;page=2')
+        second = Client().get(reverse('posts:search'),
+                              {'q': 'кошка', 'page': 2})
+        self.assertEqual(len(second.context['page_obj']), 4)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(reverse('admin:posts_post_changelist'),
+                              {'q': 'кошка'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.in_text])
@@ -0,0 +1,59 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+
+from core.sqlite import retry_on_lock
+
+from ..models import Group
+
+
+@mock.patch('core.sqlite.RETRY_DELAY', 0)
+class SqliteTuningTest(TestCase):
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    @override_settings(SQLITE_WRITE_RETRIES=2)
+    def test_write_retried_in_transaction(self):
+        calls = []
+
+        @retry_on_lock
+        def create():
+            Group.objects.create(title='Группа', slug=f'g{len(calls)}',
+                                 description='')
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(create(), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(list(Group.objects.values_list('slug', flat=True)),
+                         ['g2'])
+
+    @override_settings(SQLITE_WRITE_RETRIES=2)
+    def test_gives_up(self):
+        calls = []
+
+        @retry_on_lock
+        def fail(message):
+            calls.append(1)
+            raise OperationalError(message)
+
+        with self.assertRaises(OperationalError):
+            fail('database is locked')
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(OperationalError):
+            fail('no such table: posts_post')
+        self.assertEqual(len(calls), 4)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_sqlite', threads=2, seconds=0.2, stdout=out)
+        self.assertIn('SQLITE_PRAGMAS', out.getvalue())
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+
+from .. import uploads
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   IMAGE_RELEASE_GRACE=0)
+class ContentAddressedStorageTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='meme')
+
+    def create_post(self, name, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile(name, content, 'image/gif'),
+        )
+
+    def test_same_content_is_stored_once(self):
+        first = self.create_post('meme.gif')
+        second = self.create_post('repost.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/[0-9a-f]{2}/'
+                                           r'[0-9a-f]{64}\.gif$')
+        other = default_storage.save('posts/other.gif',
+                                     ContentFile(SMALL_GIF + b'!'))
+        self.assertNotEqual(other, first.image.name)
+
+    def test_file_removed_with_last_reference(self):
+        first = self.create_post('meme.gif')
+        second = self.create_post('repost.gif')
+        name = first.image.name
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        second.image = SimpleUploadedFile('new.gif', SMALL_GIF + b'!',
+                                          'image/gif')
+        second.save()
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(default_storage.exists(second.image.name))
+
+    @override_settings(IMAGE_RELEASE_GRACE=60)
+    def test_reused_file_outlives_release(self):
+        post = self.create_post('meme.gif')
+        name = post.image.name
+        path = default_storage.path(name)
+        old = time.time() - 3600
+        os.utime(path, (old, old))
+        # Новый пост получил тот же файл, но ещё не сохранён
+        default_storage.save('posts/repost.gif', ContentFile(SMALL_GIF))
+        post.delete()
+        self.assertTrue(default_storage.exists(name))
+        os.utime(path, (old, old))
+        uploads.release(name)
+        self.assertFalse(default_storage.exists(name))
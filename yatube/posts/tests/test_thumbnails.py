@@ -0,0 +1,173 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from core.kvstore import LRU, KVStore
+
+from .. import thumbnails
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='painter')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='small.gif'):
+        return Post.objects.create(
+            author=self.user, text='С картинкой',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'),
+        )
+
+    def page(self, post):
+        return Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+
+    def test_command_prepares_all_sizes(self):
+        post = self.create_post()
+        self.assertEqual(thumbnails.ready(post, 'card')['url'],
+                         post.image.url)
+        call_command('thumbnails', workers=2, stdout=StringIO())
+        post.refresh_from_db()
+        ready = thumbnails.ready(post, 'card')
+        self.assertNotEqual(ready['url'], post.image.url)
+        self.assertEqual(list(ready['sources']), list(thumbnails.FORMATS))
+        self.assertFalse(thumbnails.pending().exists())
+
+    def test_srcset_widths(self):
+        photo = BytesIO()
+        Image.new('RGB', (1200, 300), 'blue').save(photo, 'PNG')
+        post = Post.objects.create(
+            author=self.user, text='Большая',
+            image=SimpleUploadedFile('big.png', photo.getvalue()),
+        )
+        ready = thumbnails.generate(post.id, post.image.name)['card']
+        # Картинка не увеличивается: вместо 1500 — её ширина
+        for srcset in ready['sources'].values():
+            self.assertEqual([width for _, width in srcset],
+                             [320, 500, 750, 1000, 1200])
+        self.assertEqual((ready['width'], ready['height']), (1200, 300))
+
+    def test_pages_do_not_resize_images(self):
+        post = self.create_post()
+        with mock.patch.object(thumbnails, 'get_thumbnail') as resize:
+            response = self.page(post)
+        self.assertContains(response, f'src="{post.image.url}"')
+        resize.assert_not_called()
+        thumbnails.generate(post.id, post.image.name)
+        post.refresh_from_db()
+        ready = thumbnails.ready(post, 'card')
+        # Страница из кеша сброшена, когда миниатюры появились
+        response = self.page(post)
+        for srcset in ready['sources'].values():
+            self.assertContains(response, f'{srcset[0][0]} 2w')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'decoding="async"')
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_save_schedules_new_image(self):
+        with mock.patch.object(thumbnails, '_executor') as executor:
+            post = self.create_post()
+            post.text = 'Только текст'
+            post.save()
+        executor.submit.assert_called_once_with(
+            thumbnails.run, post.id, post.image.name, True
+        )
+
+    def test_new_image_resets_thumbnails(self):
+        post = self.create_post()
+        thumbnails.generate(post.id, post.image.name)
+        post.refresh_from_db()
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF, 'image/gif')
+        post.save()
+        self.assertEqual(post.thumbnails, '')
+
+    def test_missing_file_does_not_stop_command(self):
+        Post.objects.create(author=self.user, text='Без файла',
+                            image='posts/missing.jpg')
+        self.create_post()
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            call_command('thumbnails', stdout=StringIO())
+        self.assertEqual(
+            list(thumbnails.pending().values_list('image', flat=True)),
+            ['posts/missing.jpg'],
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class KVStoreTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.kvstore = KVStore()
+        self.user = User.objects.create_user(username='keeper')
+        self.post = Post.objects.create(
+            author=self.user, text='С картинкой',
+            image=SimpleUploadedFile('kv.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def test_lru_is_bounded(self):
+        lru = LRU(2)
+        for key in 'abc':
+            lru.set(key, key)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.keys(), ['b', 'c'])
+
+    def test_metadata_lives_in_cache_not_database(self):
+        with mock.patch.object(default, 'kvstore', self.kvstore):
+            with self.assertNumQueries(0):
+                thumb = get_thumbnail(self.post.image.name, '100x100')
+            cold = KVStore()
+            with mock.patch.object(cold.cache, 'get_many',
+                                   wraps=cold.cache.get_many) as get_many:
+                cold.warm([self.post.image.name])
+            # Картинка и список её миниатюр, затем сами миниатюры
+            self.assertEqual(get_many.call_count, 2)
+            with mock.patch.object(cold.cache, 'get') as get:
+                self.assertEqual(
+                    cold.get(ImageFile(thumb.name)).size, thumb.size
+                )
+            get.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class FeedThumbnailLookupsTest(TransactionTestCase):
+    def test_feed_render_costs_no_lookups(self):
+        cache.clear()
+        user = User.objects.create_user(username='feed')
+        for _ in range(3):
+            post = Post.objects.create(
+                author=user, text='Пост',
+                image=SimpleUploadedFile('feed.gif', SMALL_GIF, 'image/gif'),
+            )
+        thumbnails.generate(post.id, post.image.name)
+        response = Client().get(reverse('posts:index'))
+        self.assertIn('thumb;desc="0 lookups"', response['Server-Timing'])
@@ -0,0 +1,85 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry, User
+
+backfill_migration = import_module('posts.migrations.0017_backfill_timelines')
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.stranger = User.objects.create_user(username='stranger')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed_ids(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.id for post in response.context['page_obj']]
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.stranger).exists()
+        )
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [Post.objects.create(author=self.author, text=f'Пост {i}')
+                 for i in range(3)]
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author}))
+        self.assertEqual(sorted(self.feed_ids()),
+                         sorted(post.id for post in posts))
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader)
+                         .exists())
+        self.assertEqual(self.feed_ids(), [])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_celebrity_posts_are_pulled_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.stranger, author=self.author)
+        post = Post.objects.create(author=self.author, text='Для всех')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_posts_survive_author_demotion(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.stranger, author=self.author)
+        post = Post.objects.create(author=self.author, text='Во время славы')
+        self.assertEqual(self.feed_ids(), [post.id])
+        Follow.objects.get(user=self.stranger, author=self.author).delete()
+        self.assertEqual(self.feed_ids(), [post.id])
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Первый')
+        self.feed_ids()
+        with self.assertNumQueries(4):
+            self.feed_ids()
+        for i in range(5):
+            Post.objects.create(author=self.author, text=f'Ещё {i}')
+        with self.assertNumQueries(4):
+            self.feed_ids()
+
+    def test_migration_fills_existing_follows(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='До миграции')
+        TimelineEntry.objects.all().delete()
+        backfill_migration.backfill_timelines(apps, None)
+        self.assertEqual(self.feed_ids(), [post.id])
@@ -7,7 +7,13 @@ from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.core.cache import cache
-from ..models import Post, Group, User, Follow
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from ..models import Post, Group, GroupStats, User, Follow, Comment
+from .. import counters
+from .. import views
+from ..paginator import NEXT, BoundedPaginator, encode_cursor
+from core.queries import QueryBudgetExceeded, query_budget
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -167,19 +173,52 @@ class PostTests(TestCase):
                              get('page_obj')), 0)
 
     def test_response_cache_correct(self):
-
+        """Главная отдаётся из кеша, пока в ленте ничего не записано."""
+        cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         post = response.context['page_obj'][0]
         response = self.authorized_client.get(reverse('posts:index'))
-        not_delete = response.content
+        cached = response.content
+        # update() не отправляет сигналов, поэтому кеш не сбрасывается
+        Post.objects.filter(pk=post.pk).update(text='Правка в обход')
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, cached)
         post.delete()
         response = self.authorized_client.get(reverse('posts:index'))
-        after_delete = response.content
-        self.assertEqual(not_delete, after_delete)
+        self.assertNotEqual(response.content, cached)
+
+    def test_writes_invalidate_cached_pages(self):
+        """Запись сразу видна на закешированных страницах."""
         cache.clear()
-        response = self.authorized_client.get(reverse('posts:index'))
-        after_cache_clear = response.content
-        self.assertNotEqual(after_delete, after_cache_clear)
+        pages = {
+            reverse('posts:index'): 'Новый пост',
+            reverse('posts:group_list',
+                    kwargs={'slug': self.group.slug}): 'Новый пост',
+            reverse('posts:profile',
+                    kwargs={'username': self.user}): 'Новый пост',
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.id}): 'Новый комментарий',
+        }
+        for url in pages:
+            self.authorized_client.get(url)
+        Post.objects.create(text='Новый пост', author=self.user,
+                            group=self.group)
+        self.post.comments.create(author=self.user,
+                                  text='Новый комментарий')
+        for url, text in pages.items():
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, text)
+
+    def test_moving_post_invalidates_old_group(self):
+        cache.clear()
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.assertContains(self.authorized_client.get(url), self.post.text)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.group2
+        post.save()
+        self.assertNotContains(self.authorized_client.get(url),
+                               self.post.text)
 
 
 class PaginatorViewsTest1(TestCase):
@@ -232,6 +271,22 @@ class PaginatorViewsTest1(TestCase):
                     self.assertEqual(post_author_0, 'auth')
                     self.assertEqual(post_group_0, 'Тестовая группа!')
 
+    def test_pages_link_to_next_page(self):
+        '''Ленты выводят ссылки на другие страницы. '''
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile',
+                    kwargs={'username': self.user.username}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                cache.clear()
+                response = self.unauthorized_client.get(page)
+                paginator = response.context['page_obj'].paginator
+                self.assertContains(response,
+                                    f'?cursor={paginator.next_cursor}')
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -269,3 +324,346 @@ class FollowTest(TestCase):
             reverse('posts:profile_unfollow',
                     kwargs={'username': self.post_follower}))
         self.assertEqual(Follow.objects.count(), count_follow - 1)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    NUM_POSTS_ALL = 23
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor')
+        cls.group = Group.objects.create(title='Курсоры', slug='cursors')
+        Post.objects.bulk_create([
+            Post(author=cls.user, group=cls.group, text=f'Пост {i}')
+            for i in range(cls.NUM_POSTS_ALL)
+        ])
+        # Одинаковое время публикации: порядок держится на id
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def walk(self, url):
+        """Пройти ленту по курсорам и вернуть id постов по страницам."""
+        pages = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {'cursor': cursor or ''})
+            page_obj = response.context['page_obj']
+            pages.append([post.id for post in page_obj])
+            cursor = page_obj.paginator.next_cursor
+            if cursor is None:
+                return pages, page_obj
+
+    def test_cursor_pages_cover_feed_without_gaps(self):
+        expected = list(Post.objects.order_by('-pub_date', '-id')
+                        .values_list('id', flat=True))
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                pages, last_page = self.walk(url)
+                self.assertEqual([len(page) for page in pages], [10, 10, 3])
+                self.assertEqual(sum(pages, []), expected)
+                self.assertFalse(last_page.has_next())
+                self.assertTrue(last_page.has_previous())
+
+    def test_previous_cursor_returns_same_page(self):
+        url = reverse('posts:index')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'cursor': first.paginator.next_cursor}
+        ).context['page_obj']
+        back = self.client.get(
+            url, {'cursor': second.paginator.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_last_cursor_returns_tail(self):
+        url = reverse('posts:index')
+        first = self.client.get(url).context['page_obj']
+        last = self.client.get(
+            url, {'cursor': first.paginator.last_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            [post.id for post in last],
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('id', flat=True))[-10:]
+        )
+        self.assertFalse(last.has_next())
+
+    def test_broken_cursor_shows_first_page(self):
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_malformed_cursor_values_show_first_page(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        values = ([True, 1], [None, 1], [[], 1], [{}, 1], ['x', 'y'],
+                  ['2021-01-01T00:00:00', 10 ** 30])
+        for url in urls:
+            for value in values:
+                with self.subTest(url=url, value=value):
+                    cache.clear()
+                    response = self.client.get(
+                        url, {'cursor': encode_cursor(NEXT, value)}
+                    )
+                    page_obj = response.context['page_obj']
+                    self.assertEqual(len(page_obj), 10)
+                    self.assertFalse(page_obj.has_previous())
+
+    def test_cursor_page_does_not_count_or_offset(self):
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'),
+                            {'cursor': first.paginator.next_cursor})
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_page_number_does_not_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'), {'page': 2})
+        sql = ' '.join(query['sql'] for query in queries).upper()
+        self.assertNotIn('COUNT(', sql)
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertTrue(page_obj.has_next())
+        self.assertEqual(list(page_obj.paginator.window), [1, 2, 3])
+        self.assertTrue(page_obj.paginator.exhausted)
+
+    def test_page_window_shows_only_nearby_pages(self):
+        posts = Post.objects.order_by('pk')
+        page = BoundedPaginator(posts, 2).get_page(6)
+        self.assertEqual(list(page.paginator.window), [4, 5, 6, 7, 8])
+        self.assertFalse(page.paginator.exhausted)
+        self.assertTrue(page.has_next())
+        last = BoundedPaginator(posts, 2).get_page(100)
+        self.assertEqual(last.number, 12)
+        self.assertEqual([post.pk for post in last], [posts.last().pk])
+        self.assertFalse(last.has_next())
+        first = BoundedPaginator(posts, 2).get_page('x')
+        self.assertEqual(first.number, 1)
+        huge = BoundedPaginator(posts, 2).get_page(10 ** 21)
+        self.assertEqual(huge.number, 12)
+
+    def test_huge_page_number_shows_last_page(self):
+        response = self.client.get(reverse('posts:index'),
+                                   {'page': '9' * 21})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 3)
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'Пост', 'page': '9' * 21})
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_page_number_does_not_count(self):
+        posts = Post.objects.order_by('pk')
+        with CaptureQueriesContext(connection) as queries:
+            last = BoundedPaginator(posts, 2).get_page(14)
+            pks = [post.pk for post in last]
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(pks, [posts.last().pk])
+        self.assertEqual(last.number, 12)
+        self.assertEqual(list(last.paginator.window), [10, 11, 12])
+        self.assertTrue(last.paginator.exhausted)
+        self.assertFalse(last.has_next())
+
+
+class CommentPaginationTest(TestCase):
+    NUM_COMMENTS_ALL = 25
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commentator')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}.')
+            for i in range(cls.NUM_COMMENTS_ALL)
+        ])
+        # Одинаковое время: порядок держится на id
+        cls.post.comments.update(created=cls.post.comments.first().created)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:post_detail',
+                           kwargs={'post_id': self.post.id})
+        self.more_url = reverse('posts:comments',
+                                kwargs={'post_id': self.post.id})
+
+    def test_first_page_and_load_more(self):
+        response = self.client.get(self.url)
+        first = response.context['page_obj']
+        self.assertEqual(len(first), views.NUM_COMMENTS)
+        self.assertContains(response, f'{self.more_url}?cursor=')
+        response = self.client.get(
+            self.more_url, {'cursor': first.paginator.next_cursor}
+        )
+        rest = response.context['page_obj']
+        self.assertIsNone(rest.paginator.next_cursor)
+        self.assertNotContains(response, 'data-load-more')
+        expected = list(self.post.comments.order_by('created', 'id')
+                        .values_list('id', flat=True))
+        self.assertEqual([comment.id for comment in first]
+                         + [comment.id for comment in rest], expected)
+
+    def test_first_page_is_shared_between_readers(self):
+        self.client.get(self.url)
+        self.post.comments.update(text='Изменён без сигнала')
+        reader = Client()
+        reader.force_login(User.objects.create_user(username='reader'))
+        response = reader.get(self.url)
+        self.assertContains(response, 'Комментарий 0.')
+        self.assertNotContains(response, 'Изменён без сигнала')
+
+    def test_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class GroupIndexTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.quiet = Group.objects.create(title='Тихая', slug='quiet')
+        cls.busy = Group.objects.create(title='Шумная', slug='busy')
+        cls.empty = Group.objects.create(title='Пустая', slug='empty')
+        for username, count in (('first', 1), ('second', 3), ('third', 2),
+                                ('fourth', 2)):
+            author = User.objects.create_user(username=username)
+            for _ in range(count):
+                Post.objects.create(author=author, group=cls.busy,
+                                    text='Пост')
+        Post.objects.create(author=author, group=cls.quiet, text='Пост')
+        Post.objects.filter(group=cls.quiet).update(
+            pub_date=Post.objects.earliest('pub_date').pub_date
+        )
+
+    def setUp(self):
+        cache.clear()
+        counters.recount_groups()
+
+    def test_new_group_gets_stats(self):
+        self.assertTrue(GroupStats.objects.filter(group=self.empty).exists())
+
+    def test_recount_groups(self):
+        busy = self.busy.stats
+        busy.refresh_from_db()
+        self.assertEqual(busy.posts_count, 8)
+        self.assertEqual(busy.last_post_at,
+                         self.busy.posts.latest('pub_date').pub_date)
+        self.assertEqual(busy.authors(),
+                         [['second', 3], ['fourth', 2], ['third', 2]])
+
+    def test_groups_page_orders_by_activity(self):
+        response = self.client.get(reverse('posts:groups'))
+        groups = [stats.group for stats in response.context['page_obj']]
+        self.assertEqual(groups, [self.busy, self.quiet, self.empty])
+        self.assertContains(response, 'Записей: 8')
+
+    def test_sidebar_waits_for_recount(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.quiet.slug})
+        response = self.client.get(url)
+        self.assertContains(response, reverse('posts:groups'))
+        self.assertContains(response, 'Записей: 8')
+        self.assertContains(response, reverse('posts:profile',
+                                              args=['second']))
+        self.assertNotContains(response, 'Пустая')
+        Post.objects.create(author=User.objects.get(username='first'),
+                            group=self.empty, text='Первый')
+        self.assertNotContains(self.client.get(url), 'Пустая')
+        counters.recount_groups()
+        self.assertContains(self.client.get(url), 'Пустая')
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='budget_author')
+        cls.reader = User.objects.create_user(username='budget_reader')
+        cls.group = Group.objects.create(title='Бюджет', slug='budget')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(author=cls.author, group=cls.group,
+                                       text='Пост с комментариями')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def pages(self):
+        return (
+            (views.index, reverse('posts:index')),
+            (views.group_posts, reverse('posts:group_list',
+                                        kwargs={'slug': self.group.slug})),
+            (views.profile, reverse('posts:profile',
+                                    kwargs={'username': self.author})),
+            (views.post_detail, reverse('posts:post_detail',
+                                        kwargs={'post_id': self.post.id})),
+            (views.follow_index, reverse('posts:follow_index')),
+            (views.group_index, reverse('posts:groups')),
+        )
+
+    def add_content(self, count):
+        for i in range(count):
+            Post.objects.create(author=self.author, group=self.group,
+                                text=f'Ещё пост {i}')
+            Comment.objects.create(post=self.post, author=self.reader,
+                                   text=f'Комментарий {i}')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_views_fit_budget_regardless_of_content(self):
+        self.add_content(1)
+        before = {url: self.count_queries(url) for _, url in self.pages()}
+        self.add_content(12)
+        for view, url in self.pages():
+            with self.subTest(url=url):
+                count = self.count_queries(url)
+                self.assertLessEqual(count, view.query_budget)
+                self.assertEqual(count, before[url])
+
+    def test_stale_page_number_fits_budget(self):
+        for view, url in self.pages():
+            with self.subTest(url=url):
+                self.assertLessEqual(self.count_queries(f'{url}?page=3'),
+                                     view.query_budget)
+
+    def test_exceeded_budget_raises(self):
+        @query_budget(1)
+        def view(request):
+            list(User.objects.all())
+            list(Group.objects.all())
+
+        with self.assertRaises(QueryBudgetExceeded):
+            view(self.client.get('/').wsgi_request)
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_exceeded_budget_is_logged(self):
+        @query_budget(0)
+        def view(request):
+            list(User.objects.all())
+
+        with self.assertLogs('core.queries', 'WARNING'):
+            view(self.client.get('/').wsgi_request)
@@ -0,0 +1,126 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Для каждого размера из SIZES нарезается набор ширин для srcset в каждом
+формате из FORMATS: браузер сам выбирает файл по ширине экрана и
+плотности пикселей. Миниатюры готовятся вне запроса: командой
+manage.py thumbnails, которая обрабатывает посты с пустым
+Post.thumbnails пулом потоков, а при THUMBNAIL_WORKERS > 0 — ещё и пулом
+потоков веб-процесса сразу после сохранения поста. Готовые адреса
+и размеры хранятся в Post.thumbnails, шаблон берёт их через ready();
+пока миниатюр нет, показывается исходная картинка, и запрос ничего
+не пережимает.
+"""
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Имя размера: (ширина и высота рамки на странице, ширины для srcset).
+# Картинка вписывается в рамку с сохранением пропорций и не увеличивается
+SIZES = {
+    'card': (500, 177, (320, 500, 750, 1000, 1500)),
+}
+# MIME-тип: формат sorl; последний — запасной для старых браузеров
+FORMATS = {
+    'image/webp': 'WEBP',
+    'image/jpeg': 'JPEG',
+}
+
+# Отправляется с post_id, когда миниатюры поста готовы
+thumbnails_ready = Signal()
+
+_executor = None
+
+
+def pending():
+    """Посты с картинкой, для которых миниатюры ещё не готовы."""
+    return Post.objects.exclude(image='').filter(thumbnails='')
+
+
+def _srcset(name, box, widths, fmt):
+    """Миниатюры формата fmt как [[адрес, ширина], ...] и размер наибольшей.
+
+    Маленькая картинка не увеличивается, поэтому одинаковые по ширине
+    миниатюры в набор не попадают.
+    """
+    srcset = []
+    for width in widths:
+        height = round(width * box[1] / box[0])
+        thumb = get_thumbnail(name, f'{width}x{height}', format=fmt,
+                              upscale=False)
+        if srcset and srcset[-1][1] == thumb.width:
+            break
+        srcset.append([thumb.url, thumb.width])
+    return srcset, (thumb.width, thumb.height)
+
+
+def warm(names):
+    """Прочитать метаданные sorl пачки картинок одним get_many."""
+    if hasattr(default.kvstore, 'warm'):
+        default.kvstore.warm(names)
+
+
+def generate(post_id, name):
+    """Нарезать все размеры картинки и записать их адреса в пост."""
+    ready = {}
+    for size, (width, height, widths) in SIZES.items():
+        sources = {}
+        for mime, fmt in FORMATS.items():
+            sources[mime], largest = _srcset(name, (width, height),
+                                             widths, fmt)
+        ready[size] = {'sources': sources, 'width': largest[0],
+                       'height': largest[1]}
+    # Картинку могли заменить, пока нарезались миниатюры старой
+    if Post.objects.filter(pk=post_id, image=name).update(
+            thumbnails=json.dumps(ready), updated=timezone.now()):
+        thumbnails_ready.send(sender=Post, post_id=post_id)
+    return ready
+
+
+def run(post_id, name, in_worker=False):
+    """generate(), не роняющий пул на битых и удалённых файлах."""
+    try:
+        return generate(post_id, name)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры %s', name)
+    finally:
+        if in_worker:
+            connections.close_all()
+
+
+def schedule(post):
+    """Отдать пост пулу веб-процесса после фиксации транзакции."""
+    global _executor
+    if not settings.THUMBNAIL_WORKERS or not post.image:
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+        )
+    job = (post.pk, post.image.name, True)
+    transaction.on_commit(lambda: _executor.submit(run, *job))
+
+
+def ready(post, size):
+    """Наборы миниатюр размера size по MIME-типам и размер наибольшей.
+
+    Пока миниатюр нет, вместо них — исходная картинка.
+    """
+    if not post.image:
+        return None
+    if not post.thumbnails:
+        return {'sources': {}, 'url': post.image.url,
+                'width': post.image_width, 'height': post.image_height}
+    found = json.loads(post.thumbnails)[size]
+    # Запасной формат — последний набор, его наибольший файл — в src
+    found['url'] = list(found['sources'].values())[-1][-1][0]
+    return found
@@ -0,0 +1,121 @@
+"""Лента подписок с раскладкой постов при публикации (fan-out on write).
+
+Новый пост записывается в TimelineEntry каждого подписчика автора, так что
+follow_index читает ленту одним индексированным запросом. Авторов с очень
+большим числом подписчиков («знаменитостей») не раскладываем: их посты
+подмешиваются в ленту при чтении.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+# Сортировка ленты по полям TimelineEntry, чтобы читать её по индексу
+# (user, pub_date, post); значения совпадают с Post.pub_date и Post.pk
+FEED_ORDERING = ('-timeline_entries__pub_date', '-timeline_entries__post__id')
+FEED_KEYS = ('pub_date', 'pk')
+
+
+def _followers(author_id):
+    """id подписчиков автора или None, если автор — знаменитость."""
+    if AuthorStats.objects.filter(
+            user_id=author_id,
+            followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).exists():
+        return None
+    return list(Follow.objects.filter(author_id=author_id)
+                .values_list('user_id', flat=True))
+
+
+def celebrity_ids(user):
+    """id авторов из подписок пользователя, чьи посты не раскладываются."""
+    return AuthorStats.objects.filter(
+        user__following__user=user,
+        followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).values_list('user_id', flat=True)
+
+
+def fan_out(post):
+    """Положить новый пост в ленты подписчиков автора."""
+    followers = _followers(post.author_id)
+    if not followers:
+        return
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту свежие посты автора после подписки."""
+    if _followers(author_id) is None:
+        return
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:settings.TIMELINE_BACKFILL_POSTS]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def demote(author_id):
+    """Разложить посты автора, который перестал быть знаменитостью.
+
+    Его посты времён «славы» не раскладывались и, пока он был в
+    celebrity_ids, подмешивались при чтении; теперь лента читается только
+    из TimelineEntry, поэтому подписчикам добавляются его свежие посты.
+    Вызывается после отписки, когда число подписчиков опустилось ровно
+    на единицу ниже порога.
+    """
+    if not AuthorStats.objects.filter(
+            user_id=author_id,
+            followers_count=settings.TIMELINE_CELEBRITY_FOLLOWERS - 1,
+    ).exists():
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id)
+
+
+def prune(user_id, author_id):
+    """Убрать из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild(user):
+    """Собрать ленту пользователя заново, например после массовой загрузки."""
+    TimelineEntry.objects.filter(user=user).delete()
+    authors = Follow.objects.filter(user=user).values_list('author_id',
+                                                           flat=True)
+    for author_id in set(authors):
+        backfill(user.pk, author_id)
+
+
+def feed(user):
+    """Посты ленты подписок и параметры курсорной пагинации для них.
+
+    Без знаменитостей лента читается по индексу TimelineEntry целиком,
+    иначе к разложенным постам добавляются посты знаменитостей.
+    """
+    celebrities = list(celebrity_ids(user))
+    if not celebrities:
+        return Post.objects.all(), {
+            'where': Q(timeline_entries__user=user),
+            'ordering': FEED_ORDERING,
+            'keys': FEED_KEYS,
+        }
+    entries = TimelineEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.all(), {
+        'where': Q(pk__in=entries) | Q(author_id__in=celebrities),
+    }
@@ -0,0 +1,267 @@
+"""Массовый перенос постов в NDJSON/CSV и обратно.
+
+Запись поста: text, pub_date (ISO 8601), author (username), group (slug
+или пусто) и image — путь картинки относительно каталога с файлами.
+Импорт вставляет посты bulk_create пачками, каждая пачка — отдельная
+транзакция. Авторы и группы ищутся по словарям в памяти, недостающие
+создаются; картинки копируются пулом потоков.
+
+bulk_create обходит сигналы posts.signals, поэтому после загрузки
+пересчитываются счётчики авторов, ленты их подписчиков, запасной
+поисковый индекс и версии кеша. Миниатюры готовит manage.py thumbnails.
+"""
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, search, timeline
+from .models import Follow, Group, Post
+
+User = get_user_model()
+
+FIELDS = ('id', 'text', 'pub_date', 'author', 'group', 'image')
+FORMATS = ('ndjson', 'csv')
+UPLOAD_TO = Post._meta.get_field('image').upload_to
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+_explicit = threading.local()
+
+
+def _keep_explicit(field):
+    """Научить поле не затирать заданное значение внутри explicit_dates."""
+    if getattr(field, '_keeps_explicit', False):
+        return
+    pre_save = field.pre_save
+
+    def keep_explicit(model_instance, add):
+        value = getattr(model_instance, field.attname)
+        if value is not None and field in getattr(_explicit, 'fields', ()):
+            return value
+        return pre_save(model_instance, add)
+
+    field.pre_save = keep_explicit
+    field._keeps_explicit = True
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Разрешить задавать значения полям с auto_now_add.
+
+    Действует только в текущем потоке: запросы в соседних потоках
+    по-прежнему получают текущее время.
+    """
+    for field in fields:
+        _keep_explicit(field)
+    saved = getattr(_explicit, 'fields', frozenset())
+    _explicit.fields = saved | set(fields)
+    try:
+        yield
+    finally:
+        _explicit.fields = saved
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def read_records(stream, fmt):
+    """Записи файла по одной, без загрузки всего файла в память."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def write_records(stream, fmt, records):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, FIELDS, lineterminator='\n')
+        writer.writeheader()
+        for record in records:
+            writer.writerow({**record, 'group': record['group'] or ''})
+        return
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def export_records(posts):
+    """Посты как записи для write_records, потоком из курсора базы."""
+    rows = posts.order_by('pk').values_list(
+        'pk', 'text', 'pub_date', 'author__username', 'group__slug', 'image'
+    )
+    for pk, text, pub_date, author, group, image in rows.iterator():
+        yield dict(zip(FIELDS, (pk, text, pub_date.isoformat(), author,
+                                group, image)))
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise InvalidRecord(f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+def clean(record):
+    """Проверенная запись: (text, pub_date, author, group, image)."""
+    if not isinstance(record, dict):
+        raise InvalidRecord('запись не разобрана')
+    for field in FIELDS[1:]:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise InvalidRecord(f'{field} должно быть строкой')
+    text = record.get('text')
+    author = record.get('author')
+    if not text or not author:
+        raise InvalidRecord('нужны text и author')
+    return (text, parse_date(record.get('pub_date')), author,
+            record.get('group') or None, record.get('image') or '')
+
+
+def copy_image(source, name):
+    """Положить файл из каталога source в хранилище, вернуть его имя.
+
+    Если файл не прочитался, вместо имени возвращается ошибка.
+    """
+    if source is None or not name:
+        return name
+    try:
+        with open(os.path.join(source, name), 'rb') as image:
+            return default_storage.save(
+                os.path.join(UPLOAD_TO, os.path.basename(name)), File(image)
+            )
+    except OSError as error:
+        return error
+
+
+def export_image(name, target):
+    """Скопировать картинку из хранилища в каталог target."""
+    path = os.path.join(target, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with default_storage.open(name) as image, open(path, 'wb') as copy:
+        for chunk in image.chunks():
+            copy.write(chunk)
+
+
+class Importer:
+    """Загрузка записей пачками; итог копится в атрибутах."""
+
+    def __init__(self, batch_size=1000, media=None, workers=4):
+        self.batch_size = batch_size
+        self.media = media
+        self.workers = workers
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.imported = 0
+        self.errors = []
+        self.touched_authors = set()
+        self.touched_groups = set()
+        self.first_pk = None
+
+    def _resolve(self, lookup, model, field, values, defaults):
+        missing = {value for value in values if value not in lookup}
+        if not missing:
+            return
+        model.objects.bulk_create(
+            [model(**{field: value}, **defaults(value)) for value in missing],
+            ignore_conflicts=True,
+        )
+        lookup.update(model.objects.filter(**{f'{field}__in': missing})
+                      .values_list(field, 'pk'))
+
+    def _copy_images(self, rows):
+        """Скопировать картинки пачки; строки с ошибкой отбрасываются."""
+        with ThreadPoolExecutor(self.workers) as executor:
+            images = executor.map(
+                lambda row: copy_image(self.media, row[1][4]), rows
+            )
+            for (number, row), image in zip(rows, images):
+                if isinstance(image, OSError):
+                    self.errors.append((number, str(image)))
+                else:
+                    yield row[:4] + (image,)
+
+    def _insert(self, rows):
+        rows = list(self._copy_images(rows))
+        with transaction.atomic():
+            self._resolve(self.authors, User, 'username',
+                          {row[2] for row in rows},
+                          lambda username: {'password': '!'})
+            self._resolve(self.groups, Group, 'slug',
+                          {row[3] for row in rows if row[3]},
+                          lambda slug: {'title': slug, 'description': ''})
+            posts = [
+                Post(text=text, pub_date=pub_date,
+                     author_id=self.authors[author],
+                     group_id=self.groups.get(group), image=image)
+                for text, pub_date, author, group, image in rows
+            ]
+            Post.objects.bulk_create(posts)
+        self.touched_authors.update(post.author_id for post in posts)
+        self.touched_groups.update(row[3] for row in rows if row[3])
+        self.imported += len(posts)
+
+    def load(self, records):
+        """Загрузить записи; битые пропускаются и попадают в errors."""
+        last = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        self.first_pk = (last.first() or 0) + 1
+        rows = []
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            for number, record in enumerate(records, 1):
+                try:
+                    rows.append((number, clean(record)))
+                except (ValueError, TypeError) as error:
+                    self.errors.append((number, str(error)))
+                if len(rows) == self.batch_size:
+                    self._insert(rows)
+                    rows = []
+            if rows:
+                self._insert(rows)
+        self.finish()
+
+    def finish(self):
+        """Обновить то, что обычно поддерживают сигналы."""
+        author_ids = sorted(self.touched_authors)
+        for start in range(0, len(author_ids), self.batch_size):
+            self._refresh_authors(author_ids[start:start + self.batch_size])
+        if search.backend() == search.PYTHON_BACKEND:
+            posts = Post.objects.filter(pk__gte=self.first_pk)
+            for pk, text in posts.values_list('pk', 'text').iterator():
+                search.index_text(pk, text)
+        caching.bump('index', *(f'group:{slug}'
+                                for slug in self.touched_groups))
+
+    def _refresh_authors(self, author_ids):
+        """Счётчики, ленты подписчиков и кеш профилей пачки авторов."""
+        authors = User.objects.filter(pk__in=author_ids)
+        counters.recount_authors(authors)
+        followers = User.objects.filter(
+            pk__in=Follow.objects.filter(author__in=authors)
+            .values('user_id')
+        )
+        for user in followers:
+            timeline.rebuild(user)
+        caching.bump(*(f'profile:{username}' for username
+                       in authors.values_list('username', flat=True)))
@@ -0,0 +1,155 @@
+"""Обработка загруженных картинок постов перед сохранением.
+
+Загрузка кладётся на диск кусками (большие файлы Django уже держит во
+временном файле), затем в пуле процессов картинка поворачивается по
+EXIF, уменьшается до IMAGE_MAX_SIDE по большей стороне и пережимается
+в первый формат из IMAGE_FORMATS, который умеет сохранять Pillow.
+Метаданные (EXIF, GPS, профили) в новый файл не переносятся. Ширина
+и высота результата записываются в Post.image_width/image_height.
+
+При IMAGE_WORKERS = 0 картинка обрабатывается в процессе запроса.
+Если дочерний процесс пула погиб (например, его убило ядро по памяти),
+загрузка получает BrokenProcessPool, а следующая создаст новый пул.
+
+Хранилище (core.storage.ContentAddressedStorage) кладёт одинаковые
+картинки в один файл, поэтому файл удаляется только вместе с последним
+постом, который на него ссылается (release). Новый пост с той же
+картинкой мог уже получить имя файла, но ещё не зафиксировать запись:
+файл, который записывали или переиспользовали позже, чем
+IMAGE_RELEASE_GRACE секунд назад, не удаляется.
+"""
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+from sorl import thumbnail
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'AVIF': '.avif', 'WEBP': '.webp', 'JPEG': '.jpg'}
+
+_executor = None
+
+
+class Processed(ContentFile):
+    """Пережатая картинка с размерами."""
+
+    def __init__(self, content, name, width, height):
+        super().__init__(content, name)
+        self.width = width
+        self.height = height
+
+
+def encoder():
+    """Первый из IMAGE_FORMATS, который может записать Pillow."""
+    Image.init()
+    for fmt in settings.IMAGE_FORMATS:
+        if fmt in Image.SAVE:
+            return fmt
+    return 'JPEG'
+
+
+def process(path, max_side, fmt, quality):
+    """Пережать файл path; вернуть (байты, ширина, высота).
+
+    Выполняется в дочернем процессе, поэтому не трогает Django.
+    """
+    with Image.open(path) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе
+        source.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    alpha = 'A' in image.getbands() or 'transparency' in image.info
+    image = image.convert('RGBA' if alpha and fmt != 'JPEG' else 'RGB')
+    output = BytesIO()
+    image.save(output, fmt, quality=quality, optimize=fmt == 'JPEG')
+    return output.getvalue(), image.width, image.height
+
+
+def spool(upload):
+    """Путь к загрузке на диске и признак, что файл временный наш."""
+    if hasattr(upload, 'temporary_file_path'):
+        return upload.temporary_file_path(), False
+    with tempfile.NamedTemporaryFile(
+            dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False) as spooled:
+        upload.seek(0)
+        for chunk in upload.chunks():
+            spooled.write(chunk)
+    return spooled.name, True
+
+
+def submit(*args):
+    global _executor
+    if not settings.IMAGE_WORKERS:
+        return process(*args)
+    if _executor is None:
+        _executor = ProcessPoolExecutor(settings.IMAGE_WORKERS)
+    try:
+        return _executor.submit(process, *args).result()
+    except BrokenProcessPool:
+        logger.exception('Пул обработки картинок сломан, создаём заново')
+        _executor.shutdown(wait=False)
+        _executor = None
+        raise
+
+
+def ingest(upload):
+    """Загруженный файл картинки как Processed для ImageField."""
+    fmt = encoder()
+    path, spooled = spool(upload)
+    try:
+        content, width, height = submit(
+            path, settings.IMAGE_MAX_SIDE, fmt, settings.IMAGE_QUALITY
+        )
+    finally:
+        if spooled:
+            os.remove(path)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return Processed(content, name + EXTENSIONS[fmt], width, height)
+
+
+def references(name):
+    """Сколько постов ссылается на файл картинки."""
+    return Post.objects.filter(image=name).count()
+
+
+def recently_saved(name):
+    """Файл записан или переиспользован меньше IMAGE_RELEASE_GRACE назад."""
+    try:
+        modified = default_storage.get_modified_time(name)
+    except (OSError, SuspiciousFileOperation):
+        return False
+    age = timezone.now() - modified
+    return age.total_seconds() < settings.IMAGE_RELEASE_GRACE
+
+
+def _delete_unused(name):
+    if recently_saved(name) or references(name):
+        return
+    try:
+        # Миниатюры, их записи в хранилище sorl и сам файл
+        thumbnail.delete(name)
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить картинку %s', name)
+
+
+def release(name):
+    """Пост больше не ссылается на файл name: удалить его, если он ничей.
+
+    Ссылки считаются после фиксации транзакции, чтобы откат не оставил
+    пост без файла.
+    """
+    if name:
+        transaction.on_commit(lambda: _delete_unused(name))
@@ -5,15 +5,19 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('groups/', views.group_index, name='groups'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     # Профайл пользователя
     path('profile/<str:username>/', views.profile, name='profile'),
     # Просмотр записи
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='comments'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('search/', views.search_posts, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/', views.profile_follow,
          name='profile_follow'
@@ -1,47 +1,93 @@
+from functools import partial
+
 from django.shortcuts import render, get_object_or_404
-from .models import Post, Group, User, Follow
-from django.core.paginator import Paginator
+from .models import Post, Group, GroupStats, User, Follow
+from .paginator import BoundedPaginator, CursorPaginator
 from django.shortcuts import redirect
 from .forms import PostForm, CommentForm
+from . import caching, counters, search, timeline
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.conf import settings
+from django.utils.http import urlencode
+from core.queries import query_budget
+from core.replicas import use_primary
+from core.sqlite import retry_on_lock
 
 NUM_POSTS = 10
+NUM_COMMENTS = 20
+NUM_GROUPS = 20
+COMMENT_ORDERING = ('created', 'pk')
+
+
+def paginate(request, posts, **options):
+    """Страница ленты по ?cursor=; ?page=N остаётся для старых ссылок."""
+    paginator = CursorPaginator(posts, NUM_POSTS, **options)
+    page_number = request.GET.get('page')
+    if page_number and 'cursor' not in request.GET:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+def comment_page(post, cursor=None):
+    """Порция комментариев поста по (created, id) после курсора."""
+    paginator = CursorPaginator(post.comments.select_related('author'),
+                                NUM_COMMENTS, ordering=COMMENT_ORDERING)
+    return paginator.get_cursor_page(cursor)
+
 
+def post_scopes(post_id):
+    """Области кеша страницы поста: сам пост и профиль его автора."""
+    username = (Post.objects.filter(pk=post_id)
+                .values_list('author__username', flat=True).first())
+    return [f'post:{post_id}', f'profile:{username}']
 
-@cache_page(20, key_prefix='index_page')
+
+@query_budget(3)
+@caching.cache_page('index', lambda: ['index'])
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
-    paginator = Paginator(post_list, NUM_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post_list)
     context = {
         'page_obj': page_obj,
+        'cache_timeout': settings.POSTS_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+# Область 'groups' — боковая панель со сводками групп
+@query_budget(5)
+@caching.cache_page('group', lambda slug: [f'group:{slug}', 'groups'])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    paginator = Paginator(posts, NUM_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts)
     context = {'group': group,
                'page_obj': page_obj, }
     return render(request, 'posts/group_list.html', context)
 
 
+@query_budget(3)
+@caching.cache_page('groups', lambda: ['groups'])
+def group_index(request):
+    """Группы по последней активности из сводок GroupStats."""
+    stats = (GroupStats.objects.select_related('group')
+             .order_by('-last_post_at', 'group_id'))
+    paginator = BoundedPaginator(stats, NUM_GROUPS)
+    context = {'page_obj': paginator.get_page(request.GET.get('page'))}
+    return render(request, 'posts/groups.html', context)
+
+
+@query_budget(5)
+@caching.cache_page('profile', lambda username: [f'profile:{username}'])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     following = (request.user.is_authenticated
                  and request.user.follower.filter(author=author).exists()
                  )
-    posts = author.posts.select_related('author')
-    count = author.posts.count()
-    paginator = Paginator(posts, NUM_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = author.posts.select_related('author', 'group')
+    count = counters.stats(author).posts_count
+    page_obj = paginate(request, posts)
     context = {
         'author': author,
         'count': count,
@@ -52,11 +98,14 @@ def profile(request, username):
     return render(request, template, context)
 
 
+@query_budget(5)
+@caching.cache_page('post', post_scopes)
 def post_detail(request, post_id):
     # Здесь код запроса к модели и создание словаря контекста
-    post = get_object_or_404(Post, id=post_id)
-    posts_author = post.author
-    posts_count = Post.objects.filter(author=posts_author).count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    posts_count = counters.stats(post.author).posts_count
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -69,13 +118,30 @@ def post_detail(request, post_id):
         'posts_count': posts_count,
         'post': post,
         'form': form,
-        'comments': post.comments.all(),
+        # Первую порцию шаблон берёт из кеша фрагмента, общего для всех
+        # читателей поста, и запрашивает только при промахе
+        'comments': partial(comment_page, post),
+        'cache_timeout': settings.POSTS_CACHE_TIMEOUT,
     }
 
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(3)
+@caching.cache_page('comments', post_scopes)
+def post_comments(request, post_id):
+    """Следующая порция комментариев HTML-фрагментом для «Показать ещё»."""
+    post = get_object_or_404(Post.objects.only('pk'), id=post_id)
+    context = {
+        'post': post,
+        'page_obj': comment_page(post, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
+@use_primary
+@retry_on_lock
 def post_create(request):
     if request.method == 'POST':
         form = PostForm(request.POST or None, files=request.FILES or None)
@@ -90,6 +156,8 @@ def post_create(request):
 
 
 @login_required
+@use_primary
+@retry_on_lock
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -113,6 +181,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@use_primary
+@retry_on_lock
 def add_comment(request, post_id):
     # Получите пост и сохраните его в переменную post.
     post = get_object_or_404(Post, id=post_id)
@@ -125,18 +195,20 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(4)
 @login_required
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, NUM_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts, options = timeline.feed(request.user)
+    page_obj = paginate(request, posts.select_related('author', 'group'),
+                        **options)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@use_primary
+@retry_on_lock
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -145,9 +217,24 @@ def profile_follow(request, username):
 
 
 @login_required
+@use_primary
+@retry_on_lock
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     is_follower = Follow.objects.filter(user=request.user, author=author)
     if is_follower.exists():
         is_follower.delete()
     return redirect('posts:profile', username=author)
+
+
+@query_budget(5)
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    paginator = BoundedPaginator(search.SearchResults(query), NUM_POSTS)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        # Ссылки пагинатора сохраняют запрос
+        'page_params': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
@@ -0,0 +1,23 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+В Django 2.2 своего ASGI-обработчика нет: WSGI-приложение оборачивается
+адаптером из asgiref, и запросы выполняются в пуле потоков. С Django 3.0+
+используется встроенный get_asgi_application.
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+try:
+    from django.core.asgi import get_asgi_application
+except ImportError:
+    from asgiref.wsgi import WsgiToAsgi
+    from django.core.wsgi import get_wsgi_application
+
+    application = WsgiToAsgi(get_wsgi_application())
+else:
+    application = get_asgi_application()
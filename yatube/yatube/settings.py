@@ -19,18 +19,58 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
+# Боевой режим (deploy/) задаётся окружением: YATUBE_DEBUG=0,
+# YATUBE_SECRET_KEY и YATUBE_ALLOWED_HOSTS через запятую
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'glz49j@upa#hd%_ynv451d@)9bgp4nfquliktu%ece8@^7&l$i'
+SECRET_KEY = os.environ.get(
+    'YATUBE_SECRET_KEY', 'glz49j@upa#hd%_ynv451d@)9bgp4nfquliktu%ece8@^7&l$i'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('YATUBE_DEBUG', '1') == '1'
+
+# Общий для всех воркеров кеш задаётся адресом в YATUBE_CACHE_URL:
+# redis://host:6379/0 (нужен пакет django-redis), memcached://host:11211
+# или file:///var/tmp/yatube. Без адреса — кеш в памяти процесса
+CACHE_BACKENDS = {
+    'redis': 'django_redis.cache.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+
+def cache_from_url(url):
+    if not url:
+        return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    scheme, _, location = url.partition('://')
+    if scheme == 'redis':
+        location = url
+    return {'BACKEND': CACHE_BACKENDS[scheme], 'LOCATION': location}
+
 
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    'default': cache_from_url(os.environ.get('YATUBE_CACHE_URL')),
 }
 
+# Защита от одновременного пересчёта (core.cache): значение обновляется
+# заранее с вероятностью, зависящей от beta, пока его пересчитывает один
+# воркер, остальные до CACHE_STALE_TIMEOUT секунд отдают прежнее
+CACHE_EARLY_EXPIRY_BETA = 1.0
+CACHE_LOCK_TIMEOUT = 10
+CACHE_STALE_TIMEOUT = 60
+
+# Страницы posts хранятся в кеше до записи в их области (posts.caching),
+# срок лишь ограничивает память под редко открываемые страницы
+POSTS_CACHE_TIMEOUT = 60 * 60
+# Карточки постов в лентах (core.templatetags.post_cards): ключ меняется
+# с правкой поста, срок лишь освобождает место от старых версий
+POST_CARD_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Превышение бюджета запросов (core.queries.query_budget) пишется в лог;
+# тесты включают QUERY_BUDGET_STRICT, чтобы превышение было ошибкой
+QUERY_BUDGET_STRICT = False
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 
@@ -39,10 +79,59 @@ ALLOWED_HOSTS = [
     '127.0.0.1',
     '[::1]',
     'testserver',
-]
+] + [host for host in os.environ.get('YATUBE_ALLOWED_HOSTS', '').split(',')
+     if host]
 
 NUM_OF_POSTS = 10
 
+# Лента подписок: посты авторов с таким числом подписчиков не раскладываются
+# по лентам при публикации, а подмешиваются при чтении
+TIMELINE_CELEBRITY_FOLLOWERS = 10000
+# Сколько свежих постов автора добавить в ленту при подписке
+TIMELINE_BACKFILL_POSTS = 500
+
+# Потоки веб-процесса, которые нарезают миниатюры новых картинок
+# (posts.thumbnails); при 0 это делает только manage.py thumbnails
+THUMBNAIL_WORKERS = int(os.environ.get('YATUBE_THUMBNAIL_WORKERS', 2))
+# Метаданные миниатюр sorl — в кеше и LRU процесса, а не в базе
+# (core.kvstore)
+THUMBNAIL_KVSTORE = 'core.kvstore.KVStore'
+THUMBNAIL_LRU_SIZE = 10000
+
+# Загруженные картинки (posts.uploads): большая сторона не длиннее
+# IMAGE_MAX_SIDE, формат — первый из IMAGE_FORMATS, доступный Pillow.
+# Пережимают IMAGE_WORKERS процессов; при 0 — сам процесс запроса.
+# Файл, сохранённый меньше IMAGE_RELEASE_GRACE секунд назад, не удаляется
+# вместе с последним постом: на него может ссылаться ещё не
+# зафиксированный новый пост
+IMAGE_MAX_SIDE = 2048
+IMAGE_FORMATS = ('WEBP', 'JPEG')
+IMAGE_QUALITY = 80
+IMAGE_WORKERS = int(os.environ.get('YATUBE_IMAGE_WORKERS', 2))
+IMAGE_RELEASE_GRACE = 60
+
+# Сводки групп (posts.counters.recount_groups): сколько самых активных
+# авторов хранить и сколько групп показывать в боковой панели
+GROUP_TOP_AUTHORS = 3
+GROUP_SIDEBAR_SIZE = 10
+
+# Поиск (posts.search): 'auto' — FTS5, если SQLite собран с ним,
+# иначе запасной индекс; 'fts5' или 'python' — выбрать явно
+SEARCH_BACKEND = 'auto'
+
+# Метрики (core.metrics): заголовок Server-Timing в каждом ответе и адреса
+# или сети, которым доступен /metrics (None — всем). Дополнительные
+# адреса — через запятую в YATUBE_METRICS_ALLOWED_IPS
+METRICS_SERVER_TIMING = True
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1'] + [
+    address for address in
+    os.environ.get('YATUBE_METRICS_ALLOWED_IPS', '').split(',') if address
+]
+# Каталог, через который воркеры складывают метрики для общего /metrics;
+# без него каждый процесс отдаёт только свои
+METRICS_DIR = os.environ.get('YATUBE_METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = 5
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -58,6 +147,7 @@ INSTALLED_APPS = [
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -68,6 +158,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,6 +175,10 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки хранятся по хешу содержимого: одинаковые файлы не дублируются
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+# Миниатюры sorl сами называются по хешу исходника и параметров
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
 # Путь к директории с шаблонами вынесен в переменную:
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
@@ -111,12 +207,49 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Файл базы можно вынести из каталога кода (YATUBE_DB_PATH), чтобы
+# в docker-compose.yml его делили веб-процесс и фоновые команды
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'NAME': os.environ.get(
+            'YATUBE_DB_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
+        # Соединение живёт между запросами, а не открывается на каждый
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 60)),
+    }
+}
+
+# Реплики только для чтения (core.replicas): пути к файлам SQLite через
+# запятую в YATUBE_REPLICAS. Локально их наполняет копией основной базы
+# manage.py sync_replicas; тесты запускаются без реплик
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get('YATUBE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд после записи читать с основной базы: верхняя оценка
+# отставания реплик
+REPLICA_STICKY_SECONDS = 5
+
+# Прагмы каждого нового соединения SQLite (core.sqlite); benchmark_sqlite
+# сравнивает их с настройками SQLite по умолчанию
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ на соединение
+    'cache_size': -20000,
+    'temp_store': 'memory',
 }
+# Сколько раз повторить запись, упавшую на блокировке базы
+SQLITE_WRITE_RETRIES = 3
 
 
 # Password validation
@@ -156,3 +289,9 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# Сюда собирает collectstatic; в боевом режиме файлы отдаёт nginx
+# с предсжатыми копиями (manage.py compress_static), а имена с хешем
+# содержимого позволяют кешировать их в браузере без срока
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.StaticStorage'